@@ -3,6 +3,8 @@ from io import BytesIO
 import requests
 from PIL import Image, UnidentifiedImageError
 
+import http_client
+
 ASCII_CHARS = ["@", "#", "S", "%", "?", "*", "+", ";", ":", ",", "."]
 
 
@@ -36,7 +38,7 @@ def image_url_to_ascii(url, new_width=40):
         return ""
 
     try:
-        response = requests.get(url, timeout=5)
+        response = http_client.get(url, timeout=5)
         image = Image.open(BytesIO(response.content))
     except (requests.RequestException, UnidentifiedImageError, ValueError, OSError):
         return ""
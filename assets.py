@@ -0,0 +1,632 @@
+"""
+Asset index module for files served from templates/assets.
+Resolves request paths and aliases to files without touching the filesystem,
+and serves precompressed (.gz/.br) variants when the client accepts them.
+Templates reference assets through content-hashed URLs so they can be cached
+as immutable. Files are sent with os.sendfile (via wsgi.file_wrapper) or
+offloaded to the reverse proxy, including Range requests.
+
+Run `python3 assets.py --compress` to build the precompressed variants.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import NamedTuple
+from urllib.parse import quote
+from zlib import adler32
+
+from flask import Request, Response
+from jinja2.ext import Extension
+from werkzeug.datastructures import ContentRange
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.http import is_resource_modified
+
+try:
+    import brotli
+except ImportError:  # Brotli variants are skipped if the module isn't installed
+    brotli = None
+
+ASSET_ROOT = "templates/assets"
+ASSET_RESCAN_INTERVAL = int(os.getenv("ASSET_RESCAN_INTERVAL", "5"))
+
+# Custom matching for images (alias prefix -> real prefix)
+PATH_ALIASES = {
+    "img/hns/w": "img/external/HNS/white",
+    "img/hns/b": "img/external/HNS/black",
+    "img/hns": "img/external/HNS/black",
+}
+
+# Generated directories whose files replace the originals (built with fonts.py --build)
+ASSET_OVERRIDES = {"fonts/optimised": "fonts"}
+
+# Directories searched by filename when the full path doesn't match
+FALLBACK_DIRS = ["img", "img/favicon"]
+FALLBACK_EXTENSIONS = (".png", ".jpg", ".jpeg", ".svg")
+
+# Precompressed sibling extensions in order of preference
+ENCODING_EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE_MIMETYPES = (
+    "application/javascript",
+    "application/json",
+    "application/vnd.ms-fontobject",
+    "application/xml",
+    "font/otf",
+    "font/ttf",
+    "image/svg+xml",
+    "image/vnd.microsoft.icon",
+)
+COMPRESS_MIN_SIZE = 1024
+
+# Fingerprinted URLs look like css/styles.min.<hash>.css
+FINGERPRINT_LENGTH = 10
+FINGERPRINT_PATTERN = re.compile(
+    rf"^(?P<base>.+)\.(?P<hash>[0-9a-f]{{{FINGERPRINT_LENGTH}}})(?P<ext>\.[A-Za-z0-9]+)$"
+)
+IMMUTABLE_MAX_AGE = 31536000  # 1 year
+# Large file delivery
+# SENDFILE_MODE can be "x-accel-redirect" (nginx) or "x-sendfile" (apache/lighttpd)
+SENDFILE_MODE = os.getenv("SENDFILE_MODE", "").lower()
+X_ACCEL_PREFIX = os.getenv("X_ACCEL_PREFIX", "/_files/")
+OFFLOAD_MIN_SIZE = int(os.getenv("OFFLOAD_MIN_SIZE", str(256 * 1024)))
+READ_BLOCK_SIZE = 64 * 1024
+# Asset references in exported templates, e.g. href="/assets/css/styles.min.css"
+TEMPLATE_ASSET_PATTERN = re.compile(
+    r'(?P<attr>\b(?:src|href)=")/assets/(?P<path>[^"{}]+)"'
+)
+
+
+class Asset(NamedTuple):
+    path: str  # Filesystem path
+    name: str  # Path relative to ASSET_ROOT
+    size: int
+    mtime: float
+    mimetype: str
+    encodings: tuple[tuple[str, str], ...] = ()  # (encoding, path) variants
+
+
+# Index storage
+_asset_index = {
+    "paths": {},
+    "fallback": {},
+    "files": {},
+    "version": "",
+    "timestamp": 0,
+}
+_asset_lock = threading.Lock()
+
+
+def _get_encodings(
+    full_path: str, mtime: float, stats: dict[str, os.stat_result]
+) -> tuple[tuple[str, str], ...]:
+    """
+    Find precompressed siblings of a file that are at least as new as it.
+    """
+    encodings = []
+    for encoding, extension in ENCODING_EXTENSIONS.items():
+        variant = stats.get(full_path + extension)
+        if variant and variant.st_mtime >= mtime:
+            encodings.append((encoding, full_path + extension))
+    return tuple(encodings)
+
+
+def _scan_assets() -> dict[str, Asset]:
+    """
+    Walk the asset tree and stat every file.
+    Precompressed siblings are attached to their original file.
+
+    Returns:
+        dict: Relative asset name -> Asset
+    """
+    stats = {}
+    for root, dirs, filenames in os.walk(ASSET_ROOT):
+        dirs.sort()
+        for filename in sorted(filenames):
+            full_path = os.path.join(root, filename)
+            try:
+                stats[full_path] = os.stat(full_path)
+            except OSError:
+                continue
+
+    files = {}
+    for full_path, stat in stats.items():
+        base, extension = os.path.splitext(full_path)
+        if extension in ENCODING_EXTENSIONS.values() and base in stats:
+            continue
+        name = os.path.relpath(full_path, ASSET_ROOT).replace(os.sep, "/")
+        mimetype = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        files[name] = Asset(
+            full_path,
+            name,
+            stat.st_size,
+            stat.st_mtime,
+            mimetype,
+            _get_encodings(full_path, stat.st_mtime, stats),
+        )
+    return files
+
+
+def _build_paths(files: dict[str, Asset]) -> dict[str, Asset]:
+    """
+    Map every servable request path (real names and aliases) to its asset.
+    Real names take priority over aliases, and generated overrides take
+    priority over real names.
+    """
+    paths = dict(files)
+    for directory, target in ASSET_OVERRIDES.items():
+        prefix = directory + "/"
+        for name, asset in files.items():
+            if name.startswith(prefix):
+                paths[target + "/" + name.removeprefix(prefix)] = asset
+    for alias, target in PATH_ALIASES.items():
+        prefix = target + "/"
+        for name, asset in files.items():
+            if name.startswith(prefix):
+                paths.setdefault(alias + "/" + name.removeprefix(prefix), asset)
+    return paths
+
+
+def _build_fallback(files: dict[str, Asset]) -> dict[str, Asset]:
+    """
+    Map image filenames to assets in the fallback directories.
+    Earlier directories take priority.
+    """
+    fallback = {}
+    for directory in FALLBACK_DIRS:
+        for name, asset in files.items():
+            folder, _, filename = name.rpartition("/")
+            if folder == directory and filename.endswith(FALLBACK_EXTENSIONS):
+                fallback.setdefault(filename, asset)
+    return fallback
+
+
+def refresh_asset_index(force: bool = False) -> bool:
+    """
+    Rebuild the asset index if the asset tree has changed.
+    Rescans at most once every ASSET_RESCAN_INTERVAL seconds unless forced.
+
+    Args:
+        force (bool): Rescan regardless of the interval
+
+    Returns:
+        bool: True if the index was rebuilt
+    """
+    global _asset_index
+    current_time = time.time()
+    if not force and current_time - _asset_index["timestamp"] < ASSET_RESCAN_INTERVAL:
+        return False
+
+    # Only one thread needs to rescan, others keep using the current index
+    if not _asset_lock.acquire(blocking=force):
+        return False
+    try:
+        files = _scan_assets()
+        if files == _asset_index["files"]:
+            _asset_index["timestamp"] = current_time
+            return False
+
+        signature = repr(
+            [(a.name, a.size, a.mtime, a.encodings) for a in files.values()]
+        )
+        _asset_index = {
+            "paths": _build_paths(files),
+            "fallback": _build_fallback(files),
+            "files": files,
+            "version": hashlib.sha256(signature.encode()).hexdigest()[:16],
+            "timestamp": current_time,
+        }
+        return True
+    finally:
+        _asset_lock.release()
+
+
+def find_asset(path: str) -> Asset | None:
+    """
+    Resolve a request path to an asset.
+
+    Args:
+        path (str): The path relative to /assets/
+
+    Returns:
+        Optional[Asset]: The matching asset or None if not found
+    """
+    refresh_asset_index()
+    index = _asset_index
+
+    asset = index["paths"].get(path)
+    if asset:
+        return asset
+
+    # Try looking in one of the directories
+    filename = path.rpartition("/")[2]
+    if filename.endswith(FALLBACK_EXTENSIONS):
+        return index["fallback"].get(filename)
+    return None
+
+
+def get_asset_version() -> str:
+    """
+    Get a version string that changes whenever any asset changes.
+
+    Returns:
+        str: Hash of every asset's name, size and mtime
+    """
+    refresh_asset_index()
+    return _asset_index["version"]
+
+
+def list_assets() -> list[Asset]:
+    """
+    Get every file in the asset tree.
+
+    Returns:
+        list: List of assets in tree order
+    """
+    refresh_asset_index()
+    return list(_asset_index["files"].values())
+
+
+def list_asset_paths() -> dict[str, Asset]:
+    """
+    Get every servable asset path, including aliases and overrides.
+
+    Returns:
+        dict: Path relative to /assets/ -> Asset
+    """
+    refresh_asset_index()
+    return dict(_asset_index["paths"])
+
+
+def choose_encoding(request: Request, asset: Asset) -> tuple[str | None, str]:
+    """
+    Pick the best precompressed variant of an asset for the client.
+
+    Args:
+        request (Request): The Flask request object
+        asset (Asset): The asset being served
+
+    Returns:
+        Tuple[Optional[str], str]: The content encoding (None for identity) and file path
+    """
+    best = (None, asset.path)
+    best_quality = 0
+    for encoding, path in asset.encodings:
+        quality = request.accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best = (encoding, path)
+            best_quality = quality
+    return best
+
+
+def _get_byte_range(
+    request: Request, size: int, etag: str, last_modified
+) -> tuple[int, int] | None:
+    """
+    Get the byte range to send for a Range request.
+
+    Returns:
+        Optional[Tuple[int, int]]: Start and stop offsets, or None for the full file
+
+    Raises:
+        RequestedRangeNotSatisfiable: If the range is invalid for the file
+    """
+    if "HTTP_RANGE" not in request.environ or size == 0:
+        return None
+
+    # If-Range means only send a range if the file hasn't changed
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None and if_range.date != last_modified:
+        return None
+
+    byte_range = request.range
+    range_tuple = byte_range.range_for_length(size) if byte_range else None
+    if range_tuple is None:
+        raise RequestedRangeNotSatisfiable(size)
+    return range_tuple
+
+
+def _iter_file_range(file, length: int):
+    """
+    Yield up to length bytes from a file's current position, then close it.
+    """
+    with file:
+        while length > 0:
+            chunk = file.read(min(READ_BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def deliver_file(
+    request: Request,
+    path: str,
+    mimetype: str | None = None,
+    max_age: int | None = None,
+    offload: bool = True,
+):
+    """
+    Send a file without copying it through Python where possible.
+
+    Conditional and Range requests are handled here. Large files are handed to
+    the reverse proxy with X-Accel-Redirect/X-Sendfile if SENDFILE_MODE is set,
+    otherwise the open file is passed to the server's wsgi.file_wrapper, which
+    gunicorn sends with os.sendfile (positioned at the range start).
+
+    Args:
+        request (Request): The Flask request object
+        path (str): The filesystem path
+        mimetype (Optional[str]): The mimetype, guessed from the path if not set
+        max_age (Optional[int]): Cache lifetime in seconds, or None for no-cache
+        offload (bool): Whether the file may be offloaded to the reverse proxy
+
+    Returns:
+        Response: The file response
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    mimetype = mimetype or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    response = Response(mimetype=mimetype, direct_passthrough=True)
+    response.last_modified = stat.st_mtime  # type: ignore
+    etag = f"{stat.st_mtime}-{size}-{adler32(path.encode()) & 0xFFFFFFFF}"
+    response.set_etag(etag)
+    response.accept_ranges = "bytes"
+    if max_age is None:
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.expires = int(time.time() + max_age)  # type: ignore
+
+    if not is_resource_modified(
+        request.environ, etag=etag, last_modified=response.last_modified
+    ):
+        response.status_code = 304
+        return response
+
+    # Let the reverse proxy send large files (it handles Range itself)
+    if offload and SENDFILE_MODE and size >= OFFLOAD_MIN_SIZE:
+        if SENDFILE_MODE == "x-accel-redirect":
+            relative_path = os.path.relpath(path).replace(os.sep, "/")
+            response.headers["X-Accel-Redirect"] = X_ACCEL_PREFIX + quote(relative_path)
+        else:
+            response.headers["X-Sendfile"] = os.path.abspath(path)
+        return response
+
+    start, stop = 0, size
+    byte_range = _get_byte_range(request, size, etag, response.last_modified)
+    if byte_range:
+        start, stop = byte_range
+        response.status_code = 206
+        response.content_range = ContentRange("bytes", start, stop, size)
+
+    file = open(path, "rb")  # noqa: SIM115 - closed by the WSGI server
+    file.seek(start)
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    if file_wrapper:
+        # The server stops at Content-Length, so ranges can use sendfile too
+        response.response = file_wrapper(file, READ_BLOCK_SIZE)
+    else:
+        response.response = _iter_file_range(file, stop - start)
+    response.content_length = stop - start
+    return response
+
+
+def send_asset(request: Request, asset: Asset, immutable: bool = False):
+    """
+    Send an asset, using a precompressed variant if the client accepts one.
+
+    Args:
+        request (Request): The Flask request object
+        asset (Asset): The asset to send
+        immutable (bool): Whether the URL is fingerprinted and can be cached forever
+
+    Returns:
+        Response: The file response
+    """
+    encoding, path = choose_encoding(request, asset)
+    # The proxy may not pass Content-Encoding through, so keep variants in-process
+    response = deliver_file(
+        request,
+        path,
+        mimetype=asset.mimetype,
+        max_age=IMMUTABLE_MAX_AGE if immutable else None,
+        offload=encoding is None,
+    )
+    if asset.encodings:
+        response.vary.add("Accept-Encoding")
+    if encoding:
+        response.content_encoding = encoding
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+
+@lru_cache(maxsize=1024)
+def _hash_file(full_path: str, mtime: float, size: int) -> str:
+    """
+    Hash a file's contents. Keyed on mtime and size so edits get a new hash.
+    """
+    digest = hashlib.sha256()
+    with open(full_path, "rb") as f:
+        while chunk := f.read(65536):
+            digest.update(chunk)
+    return digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def get_asset_hash(asset: Asset) -> str:
+    """
+    Get the content hash of an asset.
+
+    Args:
+        asset (Asset): The asset
+
+    Returns:
+        str: The truncated content hash
+    """
+    return _hash_file(asset.path, asset.mtime, asset.size)
+
+
+def asset_url(path: str) -> str:
+    """
+    Get the fingerprinted URL for an asset.
+
+    Args:
+        path (str): The asset path, with or without a leading /assets/
+
+    Returns:
+        str: The hashed URL or the plain URL if the asset doesn't exist
+    """
+    path = path.removeprefix("/").removeprefix("assets/")
+    asset = find_asset(path)
+    if asset is None:
+        return "/assets/" + path
+
+    base, extension = os.path.splitext(path)
+    return f"/assets/{base}.{get_asset_hash(asset)}{extension}"
+
+
+def find_fingerprinted_asset(path: str) -> tuple[Asset | None, bool]:
+    """
+    Resolve a request path that may contain a content hash.
+
+    Args:
+        path (str): The path relative to /assets/
+
+    Returns:
+        Tuple[Optional[Asset], bool]: The asset and whether the hash is current
+    """
+    asset = find_asset(path)
+    if asset:
+        return asset, False
+
+    match = FINGERPRINT_PATTERN.match(path)
+    if not match:
+        return None, False
+    asset = find_asset(match.group("base") + match.group("ext"))
+    if asset is None:
+        return None, False
+    # Outdated hashes still get the current file, just without long caching
+    return asset, get_asset_hash(asset) == match.group("hash")
+
+
+class AssetUrlExtension(Extension):
+    """
+    Jinja extension that rewrites /assets/ references in HTML templates to
+    fingerprinted URLs when the template is compiled.
+    """
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.globals["asset_url"] = asset_url
+        environment.filters["asset_url"] = asset_url
+
+    def preprocess(self, source, name, filename=None):
+        if not name or not name.endswith(".html"):
+            return source
+        return TEMPLATE_ASSET_PATTERN.sub(
+            lambda m: f'{m.group("attr")}{{{{ asset_url({m.group("path")!r}) }}}}"',
+            source,
+        )
+
+
+def is_compressible(full_path: str) -> bool:
+    """
+    Check if a file is worth precompressing.
+
+    Args:
+        full_path (str): The filesystem path
+
+    Returns:
+        bool: True for text-like files over COMPRESS_MIN_SIZE bytes
+    """
+    mimetype = mimetypes.guess_type(full_path)[0] or ""
+    if not (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_MIMETYPES):
+        return False
+    return os.path.getsize(full_path) >= COMPRESS_MIN_SIZE
+
+
+def _write_variant(full_path: str, data: bytes, extension: str) -> bool:
+    """
+    Write a compressed sibling file if it is smaller than the original.
+    The sibling is given the original's mtime so it stays paired with it.
+    """
+    original = os.stat(full_path)
+    if len(data) >= original.st_size:
+        return False
+    tmp_path = f"{full_path}{extension}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.utime(tmp_path, (original.st_atime, original.st_mtime))
+    os.replace(tmp_path, full_path + extension)
+    return True
+
+
+def compress_file(full_path: str, force: bool = False) -> list[str]:
+    """
+    Write .gz and .br siblings for a file, skipping ones that are up to date.
+
+    Args:
+        full_path (str): The filesystem path
+        force (bool): Rewrite variants even if they are up to date
+
+    Returns:
+        list: The encodings that were written
+    """
+    mtime = os.path.getmtime(full_path)
+    written = []
+    data = None
+    for encoding, extension in ENCODING_EXTENSIONS.items():
+        if encoding == "br" and brotli is None:
+            continue
+        variant = full_path + extension
+        if not force and os.path.isfile(variant) and os.path.getmtime(variant) >= mtime:
+            continue
+
+        if data is None:
+            with open(full_path, "rb") as f:
+                data = f.read()
+        if encoding == "br":
+            compressed = brotli.compress(data, quality=11)  # type: ignore
+        else:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if _write_variant(full_path, compressed, extension):
+            written.append(encoding)
+    return written
+
+
+def compress_assets(force: bool = False) -> int:
+    """
+    Precompress every compressible file in the asset tree.
+
+    Args:
+        force (bool): Rewrite variants even if they are up to date
+
+    Returns:
+        int: Number of files that had variants written
+    """
+    count = 0
+    for asset in _scan_assets().values():
+        if is_compressible(asset.path) and compress_file(asset.path, force=force):
+            count += 1
+    refresh_asset_index(force=True)
+    return count
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--compress" in sys.argv or "-c" in sys.argv:
+        if brotli is None:
+            print("Warning: brotli not installed, only writing gzip variants")
+        print("Precompressing assets...")
+        count = compress_assets(force="--force" in sys.argv)
+        print(f"Compressed {count} files.")
@@ -1,16 +1,28 @@
 import datetime
+import hashlib
+import hmac
+import math
 import os
 import re
+from itertools import takewhile
 from zoneinfo import ZoneInfo
 
 import requests
 from dateutil import parser as date_parser
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, make_response, request
 
+import http_client
 from blueprints import sol
 from blueprints.spotify import get_playing_spotify_track
-from cache_helper import get_git_latest_activity
+from cache_helper import (
+    Project,
+    apply_gitea_event,
+    get_data_cache_stats,
+    get_git_latest_activity,
+    get_project_list,
+)
 from mail import sendEmail
+from pagecache import get_page_cache_stats
 from tools import get_tools_data, getClientIP, getGitCommit, json_response, parse_date
 
 # Constants
@@ -18,8 +30,15 @@ HTTP_OK = 200
 HTTP_BAD_REQUEST = 400
 HTTP_UNAUTHORIZED = 401
 HTTP_NOT_FOUND = 404
+HTTP_LENGTH_REQUIRED = 411
+HTTP_PAYLOAD_TOO_LARGE = 413
 HTTP_UNSUPPORTED_MEDIA = 415
 HTTP_SERVER_ERROR = 500
+HTTP_NOT_MODIFIED = 304
+# Largest Gitea webhook payload accepted
+GITEA_WEBHOOK_MAX_SIZE = 1024 * 1024
+PROJECTS_PER_PAGE = 20
+PROJECTS_MAX_PER_PAGE = 100
 
 app = Blueprint("api", __name__, url_prefix="/api/v1")
 # Register solana blueprint
@@ -39,6 +58,7 @@ def help():
                 "/time": "Get the current time",
                 "/timezone": "Get the current timezone",
                 "/project": "Get the current project from git",
+                "/projects?page=N&per_page=N&fields=FIELDS&since=ISO_DATE": "Get projects from git, most recently updated first (all optional, fields is a comma separated list)",
                 "/version": "Get the current version of the website",
                 "/page_date?url=URL&verbose=BOOL": "Get the last modified date of a webpage (verbose is optional, default false)",
                 "/tools": "Get a list of tools used by Nathan Woodburn",
@@ -47,6 +67,8 @@ def help():
                 "/ping": "Just check if the site is up",
                 "/ip": "Get your IP address",
                 "/headers": "Get your request headers",
+                "/cache": "Get page cache statistics and cached data ages for this worker",
+                "/upstreams": "Get outbound request latency and error metrics for this worker",
                 "/help": "Get this help message",
             },
             "base_url": "/api/v1",
@@ -63,6 +85,51 @@ def status():
     return json_response(request, "200 OK", HTTP_OK)
 
 
+@app.route("/cache")
+def cache():
+    """Get page and data cache statistics for this worker."""
+    return jsonify(
+        {
+            "page_cache": get_page_cache_stats(),
+            "data_cache": get_data_cache_stats(),
+            "status": HTTP_OK,
+        }
+    )
+
+
+@app.route("/upstreams")
+def upstreams():
+    """Get outbound request metrics per upstream host for this worker."""
+    return jsonify({"upstreams": http_client.get_upstream_stats(), "status": HTTP_OK})
+
+
+@app.route("/webhook/gitea", methods=["POST"])
+def gitea_webhook():
+    """Update the git activity and project caches from a signed Gitea webhook."""
+    secret = os.getenv("GITEA_WEBHOOK_SECRET")
+    if not secret:
+        return json_response(request, "404 Not Found", HTTP_NOT_FOUND)
+
+    # Only read bounded payloads
+    if request.content_length is None:
+        return json_response(request, "411 Length Required", HTTP_LENGTH_REQUIRED)
+    if request.content_length > GITEA_WEBHOOK_MAX_SIZE:
+        return json_response(request, "413 Payload Too Large", HTTP_PAYLOAD_TOO_LARGE)
+
+    body = request.get_data()
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(request.headers.get("X-Gitea-Signature", ""), expected):
+        return json_response(request, "401 Unauthorized", HTTP_UNAUTHORIZED)
+
+    payload = request.get_json(force=True, silent=True)
+    if not isinstance(payload, dict):
+        return json_response(request, "400 Bad Request", HTTP_BAD_REQUEST)
+
+    if apply_gitea_event(request.headers.get("X-Gitea-Event", ""), payload):
+        return json_response(request, "Cache updated", HTTP_OK)
+    return json_response(request, "Event ignored", HTTP_OK)
+
+
 @app.route("/version")
 def version():
     """Get the current version of the website."""
@@ -169,6 +236,88 @@ def project():
     )
 
 
+@app.route("/projects")
+def projects():
+    """Get a page of projects from the cached list, most recently updated first."""
+    fields = [
+        field.strip()
+        for field in request.args.get("fields", "").split(",")
+        if field.strip()
+    ] or list(Project._fields)
+    unknown = [field for field in fields if field not in Project._fields]
+    if unknown:
+        return json_response(
+            request,
+            f"400 Bad Request unknown fields: {', '.join(unknown)}",
+            HTTP_BAD_REQUEST,
+        )
+
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("per_page", PROJECTS_PER_PAGE, type=int)
+    if page < 1 or not 1 <= per_page <= PROJECTS_MAX_PER_PAGE:
+        return json_response(
+            request,
+            f"400 Bad Request 'page' must be at least 1 and 'per_page' 1-{PROJECTS_MAX_PER_PAGE}",
+            HTTP_BAD_REQUEST,
+        )
+
+    since = None
+    if request.args.get("since"):
+        try:
+            # An unencoded + in the timezone offset arrives as a space
+            since = date_parser.isoparse(request.args["since"].replace(" ", "+"))
+        except ValueError:
+            return json_response(
+                request, "400 Bad Request 'since' invalid", HTTP_BAD_REQUEST
+            )
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.UTC)
+
+    project_list, version = get_project_list()
+    etag = hashlib.sha256(
+        f"{version}:{request.query_string.decode()}".encode()
+    ).hexdigest()[:32]
+    if request.if_none_match.contains(etag):
+        response = make_response("", HTTP_NOT_MODIFIED)
+        response.set_etag(etag)
+        return response
+
+    if since is not None:
+        # The list is sorted, so stop at the first project not updated since
+        project_list = list(
+            takewhile(lambda project: _updated_after(project, since), project_list)
+        )
+
+    start = (page - 1) * per_page
+    response = jsonify(
+        {
+            "projects": [
+                {field: getattr(project, field) for field in fields}
+                for project in project_list[start : start + per_page]
+            ],
+            "page": page,
+            "per_page": per_page,
+            "total": len(project_list),
+            "pages": math.ceil(len(project_list) / per_page),
+            "latest": project_list[0].updated_at if project_list else None,
+            "status": HTTP_OK,
+        }
+    )
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def _updated_after(project: Project, since: datetime.datetime) -> bool:
+    try:
+        updated = date_parser.isoparse(project.updated_at)
+    except ValueError:
+        return False
+    if updated.tzinfo is None:
+        updated = updated.replace(tzinfo=datetime.UTC)
+    return updated > since
+
+
 @app.route("/tools")
 def tools():
     """Get a list of tools used by Nathan Woodburn."""
@@ -215,7 +364,7 @@ def page_date():
         return json_response(request, "400 Bad Request 'url' invalid", HTTP_BAD_REQUEST)
 
     try:
-        r = requests.get(url, timeout=5)
+        r = http_client.get(url, timeout=5)
         r.raise_for_status()
     except requests.exceptions.RequestException as e:
         return json_response(
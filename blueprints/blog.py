@@ -1,22 +1,35 @@
+import hashlib
 import os
 import re
+import threading
+from collections import OrderedDict
 from functools import lru_cache
 
 import markdown
 from bs4 import BeautifulSoup
 from flask import Blueprint, jsonify, render_template, request
 
-from tools import getClientIP, getHandshakeScript, isCLI
+from snapshot import register_snapshot
+from tools import (
+    conditional_response,
+    get_mtime,
+    getClientIP,
+    getHandshakeScript,
+    isCLI,
+)
 
 app = Blueprint("blog", __name__, url_prefix="/blog")
 
 
-@lru_cache(maxsize=32)
-def list_page_files():
-    blog_pages = os.listdir("data/blog")
+BLOG_DIR = "data/blog"
+
+
+@lru_cache(maxsize=1)
+def _list_page_files(mtime):
+    blog_pages = os.listdir(BLOG_DIR)
     # Sort pages by modified time, newest first
     blog_pages.sort(
-        key=lambda x: os.path.getmtime(os.path.join("data/blog", x)), reverse=True
+        key=lambda x: os.path.getmtime(os.path.join(BLOG_DIR, x)), reverse=True
     )
 
     # Remove .md extension
@@ -27,19 +40,40 @@ def list_page_files():
     return blog_pages
 
 
+def list_page_files():
+    # Keyed on the directory mtime so added or removed posts are picked up
+    return _list_page_files(get_mtime(BLOG_DIR))
+
+
 @lru_cache(maxsize=64)
+def _read_blog_content(date, mtime):
+    with open(f"{BLOG_DIR}/{date}.md", "r") as f:
+        return f.read()
+
+
 def get_blog_content(date):
-    """Get and cache blog content."""
-    if not os.path.exists(f"data/blog/{date}.md"):
+    """Get and cache blog content, reloading it when the file changes."""
+    mtime = get_mtime(f"{BLOG_DIR}/{date}.md")
+    if not mtime:
         return None
+    return _read_blog_content(date, mtime)
 
-    with open(f"data/blog/{date}.md", "r") as f:
-        return f.read()
+
+# Rendered markdown by content hash, kept in snapshots across restarts
+MARKDOWN_CACHE_SIZE = 64
+_markdown_cache: OrderedDict[str, str] = OrderedDict()
+_markdown_lock = threading.Lock()
 
 
-@lru_cache(maxsize=64)
 def render_markdown_to_html(content):
     """Convert markdown to HTML with caching."""
+    key = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    with _markdown_lock:
+        html = _markdown_cache.get(key)
+        if html is not None:
+            _markdown_cache.move_to_end(key)
+            return html
+
     html = markdown.markdown(
         content, extensions=["sane_lists", "codehilite", "fenced_code"]
     )
@@ -47,9 +81,30 @@ def render_markdown_to_html(content):
     html = html.replace('<a href="', '<a target="_blank" href="')
     html = html.replace("<h4", "<h4 style='margin-bottom:0px;'")
     html = fix_numbered_lists(html)
+
+    with _markdown_lock:
+        _markdown_cache[key] = html
+        while len(_markdown_cache) > MARKDOWN_CACHE_SIZE:
+            _markdown_cache.popitem(last=False)
     return html
 
 
+def _load_markdown_cache(snapshot: dict):
+    with _markdown_lock:
+        for key, html in snapshot.items():
+            _markdown_cache.setdefault(key, html)
+        while len(_markdown_cache) > MARKDOWN_CACHE_SIZE:
+            _markdown_cache.popitem(last=False)
+
+
+def _dump_markdown_cache() -> dict:
+    with _markdown_lock:
+        return dict(_markdown_cache)
+
+
+register_snapshot("markdown", _dump_markdown_cache, _load_markdown_cache)
+
+
 def render_page(date, handshake_scripts=None):
     # Get cached content
     content = get_blog_content(date)
@@ -58,14 +113,18 @@ def render_page(date, handshake_scripts=None):
 
     # Get the title from the file name
     title = date.removesuffix(".md").replace("_", " ")
-    # Convert the md to html (cached)
-    html_content = render_markdown_to_html(content)
 
-    return render_template(
-        "blog/template.html",
-        title=title,
-        content=html_content,
-        handshake_scripts=handshake_scripts,
+    return conditional_response(
+        request,
+        [f"data/blog/{date}.md", "templates/blog/template.html"],
+        lambda: render_template(
+            "blog/template.html",
+            title=title,
+            # Convert the md to html (cached)
+            content=render_markdown_to_html(content),
+            handshake_scripts=handshake_scripts,
+        ),
+        handshake_scripts,
     )
 
 
@@ -188,4 +247,8 @@ def path_md(path):
         return render_template("404.html"), 404
 
     # Return the raw markdown file
-    return content, 200, {"Content-Type": "text/plain; charset=utf-8"}
+    return conditional_response(
+        request,
+        [f"data/blog/{path}.md"],
+        lambda: (content, 200, {"Content-Type": "text/plain; charset=utf-8"}),
+    )
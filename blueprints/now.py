@@ -7,15 +7,24 @@ from bs4 import BeautifulSoup
 from flask import Blueprint, jsonify, make_response, render_template, request
 
 from curl import MAX_WIDTH, get_header
-from tools import error_response, getHandshakeScript, isCLI
+from tools import (
+    conditional_response,
+    error_response,
+    get_mtime,
+    getHandshakeScript,
+    isCLI,
+)
 
 # Create blueprint
 app = Blueprint("now", __name__, url_prefix="/")
 
 
-@lru_cache(maxsize=16)
-def list_page_files():
-    now_pages = os.listdir("templates/now")
+NOW_DIR = "templates/now"
+
+
+@lru_cache(maxsize=1)
+def _list_page_files(mtime):
+    now_pages = os.listdir(NOW_DIR)
     now_pages = [
         page for page in now_pages if page != "template.html" and page != "old.html"
     ]
@@ -23,14 +32,23 @@ def list_page_files():
     return now_pages
 
 
-@lru_cache(maxsize=16)
-def list_dates():
-    now_pages = list_page_files()
+@lru_cache(maxsize=1)
+def _list_dates(mtime):
+    now_pages = _list_page_files(mtime)
     now_dates = [page.split(".")[0] for page in now_pages]
     return now_dates
 
 
-@lru_cache(maxsize=8)
+# The lists are keyed on the directory mtime, so added or removed pages are
+# picked up straight away and match the feeds' ETags
+def list_page_files():
+    return _list_page_files(get_mtime(NOW_DIR))
+
+
+def list_dates():
+    return _list_dates(get_mtime(NOW_DIR))
+
+
 def get_latest_date(formatted=False):
     if formatted:
         date_str = list_dates()[0]
@@ -62,8 +80,13 @@ def render(date, handshake_scripts=None):
         .strftime("%A, %B %d, %Y")
     )
 
-    return render_template(
-        f"now/{date}.html", DATE=date_formatted, handshake_scripts=handshake_scripts
+    return conditional_response(
+        request,
+        [f"templates/now/{date}.html"],
+        lambda: render_template(
+            f"now/{date}.html", DATE=date_formatted, handshake_scripts=handshake_scripts
+        ),
+        handshake_scripts,
     )
 
 
@@ -205,10 +228,19 @@ def rss():
     if ":" in request.host:
         host = "http://" + request.host
 
+    return conditional_response(
+        request, [NOW_DIR], lambda: render_rss(host, path), host, path
+    )
+
+
+def render_rss(host, path):
     now_pages = list_page_files()
 
-    build_date = datetime.datetime.now(tz=datetime.UTC).strftime(
-        "%a, %d %b %Y %H:%M:%S %z"
+    # Use the latest page date so the feed only changes when a page is added
+    build_date = (
+        datetime.datetime.strptime(list_dates()[0], "%y_%m_%d")
+        .replace(tzinfo=datetime.UTC)
+        .strftime("%a, %d %b %Y 00:00:00 +0000")
     )
 
     rss = (
@@ -248,11 +280,16 @@ def rss():
 
 @app.route("/now.json")
 def json():
-    now_pages = list_page_files()
     host = "https://" + request.host
     if ":" in request.host:
         host = "http://" + request.host
 
+    return conditional_response(request, [NOW_DIR], lambda: render_json(host), host)
+
+
+def render_json(host):
+    now_pages = list_page_files()
+
     formatted_pages = []
     for page in now_pages:
         page_name = page.strip(".html")
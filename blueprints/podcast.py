@@ -1,61 +1,74 @@
 import requests
 from flask import Blueprint, make_response, request
 
+import http_client
 from tools import error_response
 
 app = Blueprint("podcast", __name__)
 
+PODCAST_URL = "https://podcasts.c.woodburn.au/"
+HTTP_OK = 200
+HTTP_BAD_GATEWAY = 502
+HTTP_SERVER_ERROR = 500
+
+# Last good copy of each feed, served while the podcast server is down
+_last_feeds: dict[str, tuple[bytes, str]] = {}
+
+
+def proxy(path: str, keep: bool = False):
+    """
+    Proxy a path from the podcast server.
+
+    Args:
+        path (str): The path on the podcast server
+        keep (bool): Keep the last good copy to serve if the server fails
+    """
+    try:
+        req = http_client.get(PODCAST_URL + path, breaker=True)
+    except requests.RequestException:
+        req = None
+
+    if req is not None and req.status_code == HTTP_OK:
+        if keep:
+            _last_feeds[path] = (req.content, req.headers["Content-Type"])
+        return make_response(
+            req.content, HTTP_OK, {"Content-Type": req.headers["Content-Type"]}
+        )
+
+    # Serve the last good copy if the server is down
+    if path in _last_feeds and (req is None or req.status_code >= HTTP_SERVER_ERROR):
+        content, content_type = _last_feeds[path]
+        return make_response(content, HTTP_OK, {"Content-Type": content_type})
+
+    if req is None:
+        return error_response(request, "Podcast Server unreachable", HTTP_BAD_GATEWAY)
+    return error_response(request, "Error from Podcast Server", req.status_code)
+
 
 @app.route("/ID1")
 def index():
     # Proxy to ID1 url
-    req = requests.get("https://podcasts.c.woodburn.au/ID1")
-    if req.status_code != 200:
-        return error_response(request, "Error from Podcast Server", req.status_code)
-
-    return make_response(
-        req.content, 200, {"Content-Type": req.headers["Content-Type"]}
-    )
+    return proxy("ID1", keep=True)
 
 
 @app.route("/ID1/")
 def contents():
     # Proxy to ID1 url
-    req = requests.get("https://podcasts.c.woodburn.au/ID1/")
-    if req.status_code != 200:
-        return error_response(request, "Error from Podcast Server", req.status_code)
-    return make_response(
-        req.content, 200, {"Content-Type": req.headers["Content-Type"]}
-    )
+    return proxy("ID1/", keep=True)
 
 
 @app.route("/ID1/<path:path>")
 def path(path):
     # Proxy to ID1 url
-    req = requests.get("https://podcasts.c.woodburn.au/ID1/" + path)
-    if req.status_code != 200:
-        return error_response(request, "Error from Podcast Server", req.status_code)
-    return make_response(
-        req.content, 200, {"Content-Type": req.headers["Content-Type"]}
-    )
+    return proxy("ID1/" + path)
 
 
 @app.route("/ID1.xml")
 def xml():
     # Proxy to ID1 url
-    req = requests.get("https://podcasts.c.woodburn.au/ID1.xml")
-    if req.status_code != 200:
-        return error_response(request, "Error from Podcast Server", req.status_code)
-    return make_response(
-        req.content, 200, {"Content-Type": req.headers["Content-Type"]}
-    )
+    return proxy("ID1.xml", keep=True)
 
 
 @app.route("/podsync.opml")
 def podsync():
-    req = requests.get("https://podcasts.c.woodburn.au/podsync.opml")
-    if req.status_code != 200:
-        return error_response(request, "Error from Podcast Server", req.status_code)
-    return make_response(
-        req.content, 200, {"Content-Type": req.headers["Content-Type"]}
-    )
+    return proxy("podsync.opml", keep=True)
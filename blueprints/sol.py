@@ -11,6 +11,8 @@ from solders.pubkey import Pubkey
 from solders.system_program import TransferParams, transfer
 from solders.transaction import VersionedTransaction
 
+import http_client
+
 app = Blueprint("sol", __name__)
 
 SOLANA_HEADERS = {
@@ -48,7 +50,7 @@ def create_transaction(sender_address: str, amount: float) -> str:
         "method": "getLatestBlockhash",
         "params": [{"commitment": "confirmed"}],
     }
-    response = requests.post(rpc_url, json=payload)
+    response = http_client.post(rpc_url, breaker=True, json=payload)
     response.raise_for_status()
     result = response.json().get("result")
     if not result or "value" not in result or "blockhash" not in result["value"]:
@@ -142,7 +144,14 @@ def sol_donate_post(amount):
     if amount < 0.0001:
         return jsonify({"message": "Error: Amount too small"}), 400, SOLANA_HEADERS
 
-    transaction = create_transaction(sender, amount)
+    try:
+        transaction = create_transaction(sender, amount)
+    except requests.RequestException:
+        return (
+            jsonify({"message": "Error: Solana RPC unavailable, try again later"}),
+            503,
+            SOLANA_HEADERS,
+        )
     return (
         jsonify({"message": "Success", "transaction": transaction}),
         200,
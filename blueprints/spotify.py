@@ -5,7 +5,10 @@ import time
 import requests
 from flask import Blueprint, redirect, render_template, request, url_for
 
+import http_client
 from ascii_art import image_url_to_ascii
+from singleflight import single_flight
+from snapshot import register_snapshot
 from tools import isCLI, json_response
 
 app = Blueprint("spotify", __name__, url_prefix="/spotify")
@@ -25,16 +28,41 @@ ACCESS_TOKEN = None
 REFRESH_TOKEN = os.getenv("SPOTIFY_REFRESH_TOKEN")
 TOKEN_EXPIRES = 0
 
+# Seconds to reuse a failed or empty track lookup
+SPOTIFY_NEGATIVE_TTL = 30
+# Errors meaning there's nothing to show, rather than Spotify failing
+SPOTIFY_EMPTY_ERRORS = [
+    "Nothing is currently playing.",
+    "No recently played tracks found.",
+]
+
+# Last track fetched, shown while Spotify can't be reached
+_last_track = {"data": None, "timestamp": 0.0}
+# Last failed or empty lookup
+_negative_track = {"data": None, "timestamp": 0.0}
+
 
 def refresh_access_token():
     """Refresh Spotify access token when expired."""
-    global ACCESS_TOKEN, TOKEN_EXPIRES
-
     # If no refresh token, cannot proceed
     if not REFRESH_TOKEN:
         return None
 
     # If still valid, reuse it
+    if ACCESS_TOKEN and time.time() < TOKEN_EXPIRES - 60:
+        return ACCESS_TOKEN
+    return _refresh_access_token()
+
+
+@single_flight()
+def _refresh_access_token():
+    """
+    Get a new access token. Threads that find the token expired at the same
+    time share one refresh.
+    """
+    global ACCESS_TOKEN, TOKEN_EXPIRES
+
+    # Another thread may have refreshed it while this one was waiting
     if ACCESS_TOKEN and time.time() < TOKEN_EXPIRES - 60:
         return ACCESS_TOKEN
 
@@ -47,7 +75,9 @@ def refresh_access_token():
     }
     headers = {"Authorization": f"Basic {b64_auth}"}
 
-    response = requests.post(SPOTIFY_TOKEN_URL, data=data, headers=headers)
+    response = http_client.post(
+        SPOTIFY_TOKEN_URL, breaker=True, data=data, headers=headers
+    )
     if response.status_code != 200:
         print("Failed to refresh token:", response.text)
         return None
@@ -58,6 +88,17 @@ def refresh_access_token():
     return ACCESS_TOKEN
 
 
+def _load_last_track(snapshot: dict):
+    global _last_track
+    if snapshot["timestamp"] > _last_track["timestamp"]:
+        _last_track = {"data": snapshot["data"], "timestamp": snapshot["timestamp"]}
+
+
+register_snapshot(
+    "spotify", lambda: _last_track if _last_track["data"] else None, _load_last_track
+)
+
+
 @app.route("/login")
 def login():
     auth_query = (
@@ -80,7 +121,7 @@ def callback():
         "client_id": CLIENT_ID,
         "client_secret": CLIENT_SECRET,
     }
-    response = requests.post(SPOTIFY_TOKEN_URL, data=data)
+    response = http_client.post(SPOTIFY_TOKEN_URL, breaker=True, data=data)
     token_info = response.json()
     if "access_token" not in token_info:
         return json_response(
@@ -88,8 +129,9 @@ def callback():
         )
 
     access_token = token_info["access_token"]
-    me = requests.get(
+    me = http_client.get(
         "https://api.spotify.com/v1/me",
+        breaker=True,
         headers={"Authorization": f"Bearer {access_token}"},
     ).json()
 
@@ -121,13 +163,49 @@ def currently_playing():
 
 
 def get_playing_spotify_track():
-    """Internal function to get current playing track without HTTP context."""
+    """
+    Internal function to get current playing track without HTTP context.
+    Failed or empty lookups are reused for SPOTIFY_NEGATIVE_TTL seconds, and
+    the last track fetched is shown (paused) while Spotify can't be reached.
+    """
+    global _last_track, _negative_track
+    current_time = time.time()
+    if (
+        _negative_track["data"] is not None
+        and current_time - _negative_track["timestamp"] < SPOTIFY_NEGATIVE_TTL
+    ):
+        return dict(_negative_track["data"])
+
+    try:
+        track = fetch_playing_spotify_track()
+    except requests.RequestException as e:
+        print("Spotify API error:", e, flush=True)
+        track = {"error": "Spotify API error"}
+
+    if "error" not in track:
+        _last_track = {"data": dict(track), "timestamp": current_time}
+        return dict(track)
+
+    if track["error"] not in SPOTIFY_EMPTY_ERRORS and _last_track["data"]:
+        track = {**_last_track["data"], "is_playing": False, "stale": True}
+    _negative_track = {"data": track, "timestamp": current_time}
+    return dict(track)
+
+
+@single_flight()
+def fetch_playing_spotify_track():
+    """
+    Fetch the current playing track from Spotify.
+    Concurrent lookups share one request, so copy the result before changing it.
+    """
     token = refresh_access_token()
     if not token:
         return {"error": "Failed to refresh access token"}
 
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(SPOTIFY_CURRENTLY_PLAYING_URL, headers=headers)
+    response = http_client.get(
+        SPOTIFY_CURRENTLY_PLAYING_URL, breaker=True, headers=headers
+    )
     if response.status_code == 204:
         return get_last_spotify_track()
     elif response.status_code != 200:
@@ -157,8 +235,10 @@ def get_last_spotify_track():
         return {"error": "Failed to refresh access token"}
 
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(
-        "https://api.spotify.com/v1/me/player/recently-played", headers=headers
+    response = http_client.get(
+        "https://api.spotify.com/v1/me/player/recently-played",
+        breaker=True,
+        headers=headers,
     )
     if response.status_code != 200:
         print("Spotify API error:", response.text)
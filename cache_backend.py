@@ -0,0 +1,361 @@
+"""
+Cache backend module for data shared between workers.
+Stores JSON values along with the time they were fetched, so one worker's
+refresh serves every other worker. The backend is selected with CACHE_URL:
+
+    memory://                         In-process only (default)
+    sqlite:///.cache/data.sqlite3     Shared by every worker on one host
+    redis://:password@host:6379/0     Shared by every node (Redis protocol)
+
+Backend errors are logged and treated as a cache miss, so a broken store
+never takes the site down.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any
+from urllib.parse import unquote, urlparse
+
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+# Seconds to wait for the shared store before giving up
+CACHE_BACKEND_TIMEOUT = float(os.getenv("CACHE_BACKEND_TIMEOUT", "1"))
+# Prefix for keys in shared stores
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "website:")
+
+
+class CacheBackendError(Exception):
+    """Raised when the cache backend can't be reached."""
+
+
+class CacheBackend(ABC):
+    """Base class for cache backends."""
+
+    # Whether every worker sees the same values
+    shared = True
+
+    @abstractmethod
+    def get(self, key: str) -> tuple[Any, float] | None:
+        """
+        Get a value and the time it was stored.
+
+        Returns:
+            Optional[Tuple[Any, float]]: The value and timestamp, or None if missing
+        """
+
+    @abstractmethod
+    def set(self, key: str, value: Any, timestamp: float):
+        """Store a value with the time it was fetched."""
+
+    @abstractmethod
+    def add(self, key: str, value: Any, ttl: float) -> bool:
+        """
+        Store a value that expires after ttl seconds, unless the key exists.
+
+        Returns:
+            bool: True if the value was stored
+        """
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a key."""
+
+
+class MemoryBackend(CacheBackend):
+    """In-process backend. Each worker has its own copy."""
+
+    shared = False
+
+    def __init__(self):
+        self._data: dict[str, tuple[Any, float, float | None]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str):
+        entry = self._data.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        with self._lock:
+            entry = self._get(key)
+        return (entry[0], entry[1]) if entry else None
+
+    def set(self, key: str, value: Any, timestamp: float):
+        with self._lock:
+            self._data[key] = (value, timestamp, None)
+
+    def add(self, key: str, value: Any, ttl: float) -> bool:
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            current_time = time.time()
+            self._data[key] = (value, current_time, current_time + ttl)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteBackend(CacheBackend):
+    """Backend stored in an SQLite file, shared by every worker on the host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections can't be shared across threads or a fork
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) != pid:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=CACHE_BACKEND_TIMEOUT)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL, timestamp REAL NOT NULL, expires REAL)"
+            )
+            self._local.connection = connection
+            self._local.pid = pid
+        return self._local.connection
+
+    def _execute(self, query: str, parameters: tuple) -> sqlite3.Cursor:
+        try:
+            connection = self._connection()
+            with connection:
+                return connection.execute(query, parameters)
+        except (OSError, sqlite3.Error) as e:
+            raise CacheBackendError(f"SQLite cache error: {e}") from e
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        row = self._execute(
+            "SELECT value, timestamp FROM cache WHERE key = ?"
+            " AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(row[0]), row[1]
+        except ValueError as e:
+            raise CacheBackendError(f"Invalid SQLite cache value for {key}: {e}") from e
+
+    def set(self, key: str, value: Any, timestamp: float):
+        self._execute(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, NULL)",
+            (key, json.dumps(value), timestamp),
+        )
+
+    def add(self, key: str, value: Any, ttl: float) -> bool:
+        current_time = time.time()
+        # Replaces the row only if it has expired
+        cursor = self._execute(
+            "INSERT INTO cache VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET"
+            " value = excluded.value, timestamp = excluded.timestamp,"
+            " expires = excluded.expires"
+            " WHERE cache.expires IS NOT NULL AND cache.expires <= ?",
+            (key, json.dumps(value), current_time, current_time + ttl, current_time),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key: str):
+        self._execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class RedisBackend(CacheBackend):
+    """
+    Backend using the Redis protocol (RESP), shared by every node.
+    Only needs GET, SET (with NX and PX), DEL, AUTH and SELECT so it works
+    with Redis, Valkey, KeyDB or a local fake.
+    """
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection(
+            (self.host, self.port), timeout=CACHE_BACKEND_TIMEOUT
+        )
+        self._local.socket = sock
+        self._local.reader = sock.makefile("rb")
+        self._local.pid = os.getpid()
+        if self.password:
+            if self.username:
+                self._send("AUTH", self.username, self.password)
+            else:
+                self._send("AUTH", self.password)
+        if self.db:
+            self._send("SELECT", str(self.db))
+
+    def _close(self):
+        sock = getattr(self._local, "socket", None)
+        if sock is not None:
+            sock.close()
+        self._local.pid = None
+
+    def _send(self, *args: str):
+        command = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg.encode("utf-8")
+            command.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._local.socket.sendall(b"".join(command))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by Redis server")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode("utf-8")
+        if prefix == b"-":
+            raise CacheBackendError(f"Redis error: {payload.decode('utf-8')}")
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            return self._local.reader.read(length + 2)[:-2].decode("utf-8")
+        if prefix == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected Redis reply: {line!r}")
+
+    def _command(self, *args: str):
+        # Sockets can't be shared across threads or a fork
+        try:
+            if getattr(self._local, "pid", None) != os.getpid():
+                self._connect()
+            return self._send(*args)
+        except (OSError, ValueError) as e:
+            self._close()
+            raise CacheBackendError(f"Redis cache error: {e}") from e
+        except CacheBackendError:
+            self._close()
+            raise
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        value = self._command("GET", CACHE_KEY_PREFIX + key)
+        if value is None:
+            return None
+        try:
+            entry = json.loads(value)
+            return entry["value"], entry["timestamp"]
+        except (ValueError, TypeError, KeyError) as e:
+            raise CacheBackendError(f"Invalid Redis cache value for {key}: {e}") from e
+
+    def set(self, key: str, value: Any, timestamp: float):
+        entry = json.dumps({"value": value, "timestamp": timestamp})
+        self._command("SET", CACHE_KEY_PREFIX + key, entry)
+
+    def add(self, key: str, value: Any, ttl: float) -> bool:
+        entry = json.dumps({"value": value, "timestamp": time.time()})
+        reply = self._command(
+            "SET", CACHE_KEY_PREFIX + key, entry, "NX", "PX", str(int(ttl * 1000))
+        )
+        return reply == "OK"
+
+    def delete(self, key: str):
+        self._command("DEL", CACHE_KEY_PREFIX + key)
+
+
+def create_cache_backend(url: str) -> CacheBackend:
+    """
+    Create a cache backend from a URL.
+
+    Args:
+        url (str): memory://, sqlite:///<path> or redis://[[user]:password@]host[:port][/db]
+
+    Returns:
+        CacheBackend: The backend
+    """
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return MemoryBackend()
+    if scheme == "sqlite":
+        return SQLiteBackend(url.removeprefix("sqlite:///"))
+    if scheme == "redis":
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported cache backend: {url}")
+
+
+_cache_backend = create_cache_backend(CACHE_URL)
+
+
+def get_cache_backend() -> CacheBackend:
+    """
+    Get the configured cache backend.
+
+    Returns:
+        CacheBackend: The backend selected by CACHE_URL
+    """
+    return _cache_backend
+
+
+def get_shared(key: str) -> tuple[Any, float] | None:
+    """
+    Get a value from the shared cache, treating errors as a miss.
+
+    Returns:
+        Optional[Tuple[Any, float]]: The value and timestamp, or None if missing
+    """
+    try:
+        return _cache_backend.get(key)
+    except CacheBackendError as e:
+        print(f"Warning: Failed to read {key} from cache: {e}", flush=True)
+        return None
+
+
+def set_shared(key: str, value: Any, timestamp: float | None = None):
+    """
+    Store a value in the shared cache, logging any errors.
+
+    Args:
+        key (str): The cache key
+        value (Any): A JSON serialisable value
+        timestamp (Optional[float]): When the value was fetched, defaults to now
+    """
+    try:
+        _cache_backend.set(key, value, time.time() if timestamp is None else timestamp)
+    except CacheBackendError as e:
+        print(f"Warning: Failed to write {key} to cache: {e}", flush=True)
+
+
+def acquire_lease(key: str, ttl: float) -> bool:
+    """
+    Claim a key for ttl seconds so only one worker does a piece of work.
+    If the backend can't be reached the lease is granted, so work still happens.
+
+    Returns:
+        bool: True if this worker holds the lease
+    """
+    try:
+        return _cache_backend.add(key, os.getpid(), ttl)
+    except CacheBackendError as e:
+        print(f"Warning: Failed to acquire {key} lease: {e}", flush=True)
+        return True
+
+
+def release_lease(key: str):
+    """Release a lease claimed with acquire_lease."""
+    try:
+        _cache_backend.delete(key)
+    except CacheBackendError as e:
+        print(f"Warning: Failed to release {key} lease: {e}", flush=True)
@@ -1,130 +1,584 @@
 """
 Cache helper module for expensive API calls and configuration.
 Provides centralized caching with TTL for external API calls.
+Fetched data is shared between workers through the cache backend.
 """
 
-import datetime
+import hashlib
+import heapq
 import json
+import math
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
+from operator import attrgetter
+from typing import NamedTuple
 
 import requests
 
-# Cache storage for git data
-_git_data_cache = {"data": None, "timestamp": 0}
-_git_data_ttl = 300  # 5 minutes cache
+import http_client
+from cache_backend import (
+    acquire_lease,
+    get_cache_backend,
+    get_shared,
+    release_lease,
+    set_shared,
+)
+from fragments import register_dependency
+from singleflight import single_flight
+from snapshot import register_snapshot
+
+# Refresh cached API data once this fraction of its TTL has passed
+CACHE_REFRESH_AHEAD = float(os.getenv("CACHE_REFRESH_AHEAD", "0.8"))
+# Seconds between background refresh checks
+CACHE_REFRESH_INTERVAL = int(os.getenv("CACHE_REFRESH_INTERVAL", "15"))
+# Seconds a worker can hold an entry's refresh lease
+CACHE_REFRESH_LEASE = 30
+# Seconds to wait before fetching again after a fetch failed or returned nothing
+CACHE_NEGATIVE_TTL = int(os.getenv("CACHE_NEGATIVE_TTL", "60"))
+
+DEFAULT_GIT_ACTIVITY = {
+    "repo": {
+        "html_url": "https://nathan.woodburn.au",
+        "name": "nathanwoodburn.github.io",
+        "description": "Personal website",
+    }
+}
+
+# Local copy of the cached API data: name -> {"data", "timestamp"}
+_data_cache = {
+    "git": {"data": None, "timestamp": 0},
+    "projects": {"data": None, "timestamp": 0},
+}
+GITEA_WEBHOOK_SECRET = os.getenv("GITEA_WEBHOOK_SECRET")
+GITEA_USER = "nathanwoodburn"
+# The Gitea webhook keeps the data fresh, so polling can be much rarer. Only
+# with a shared backend, as a webhook otherwise updates just the worker it reaches
+_webhook_refresh = bool(GITEA_WEBHOOK_SECRET) and get_cache_backend().shared
+_git_data_ttl = 3600 if _webhook_refresh else 300  # 1 hour or 5 minutes cache
+_projects_ttl = 86400 if _webhook_refresh else 7200  # 1 day or 2 hours cache
+register_dependency("git", lambda: _data_cache["git"]["timestamp"])
+register_dependency("projects", lambda: _data_cache["projects"]["timestamp"])
+
+GITEA_API_URL = "https://git.woodburn.au/api/v1"
+# Repo search can list repos most recently updated first, unlike
+# /users/{user}/repos which is ordered by id
+PROJECTS_URL = f"{GITEA_API_URL}/repos/search"
+PROJECTS_PAGE_SIZE = 50  # Gitea's default maximum
+PROJECTS_MAX_PAGES = 10  # Safety limit
+PROJECTS_FETCH_WORKERS = 4
+# Seconds between full project syncs, which pick up deleted repos
+PROJECTS_FULL_SYNC_INTERVAL = 86400
+HTTP_NOT_MODIFIED = 304
+
+# Revalidation state for the project list
+_projects_sync = {"etag": None, "total": None, "full_sync": 0}
+# Gitea user id the repo search is filtered by, looked up once
+_gitea_user = {"id": None}
+# Content version of the last project list served by get_project_list
+_projects_version = {"data": None, "version": ""}
+# Guards updates to _data_cache from refreshes, webhooks and the shared cache
+_data_lock = threading.RLock()
+
+
+def fetch_git_latest_activity():
+    """
+    Fetch the latest git activity.
+
+    Returns:
+        dict: The latest activity
+
+    Raises:
+        requests.RequestException: If the request fails
+        ValueError: If the response isn't a list of activities
+    """
+    git = http_client.get(
+        "https://git.woodburn.au/api/v1/users/nathanwoodburn/activities/feeds?only-performed-by=true&limit=1",
+        breaker=True,
+        headers={
+            "Authorization": os.getenv("GIT_AUTH") or os.getenv("git_token") or ""
+        },
+        timeout=5,
+    )
+    git.raise_for_status()
+    git_data = git.json()
+    # Error bodies are JSON objects, so only accept a list of activities
+    if not isinstance(git_data, list) or not git_data:
+        raise ValueError(f"Unexpected git activity response: {git_data!r:.100}")
+    return git_data[0]
 
 
 def get_git_latest_activity():
     """
-    Get latest git activity with caching (5 minute TTL).
+    Get latest git activity with caching (5 minute TTL, 1 hour with webhooks).
+    Cached data is returned immediately and refreshed in the background.
 
     Returns:
         dict: Git activity data or default values
     """
-    global _git_data_cache
-    current_time = datetime.datetime.now(tz=datetime.UTC).timestamp()
+    return _get_data("git") or DEFAULT_GIT_ACTIVITY
 
-    # Check if cache is valid
-    if (
-        _git_data_cache["data"]
-        and (current_time - _git_data_cache["timestamp"]) < _git_data_ttl
-    ):
-        return _git_data_cache["data"]
 
-    # Fetch new data
-    git = requests.get(
-        "https://git.woodburn.au/api/v1/users/nathanwoodburn/activities/feeds?only-performed-by=true&limit=1",
-        headers={
-            "Authorization": os.getenv("GIT_AUTH") or os.getenv("git_token") or ""
+def _get_gitea_user_id() -> int:
+    if _gitea_user["id"] is None:
+        response = http_client.get(
+            f"{GITEA_API_URL}/users/{GITEA_USER}", breaker=True, timeout=5
+        )
+        response.raise_for_status()
+        _gitea_user["id"] = response.json()["id"]
+    return _gitea_user["id"]
+
+
+def _fetch_projects_page(page: int, etag: str | None = None) -> requests.Response:
+    headers = {"If-None-Match": etag} if etag else {}
+    response = http_client.get(
+        PROJECTS_URL,
+        breaker=True,
+        params={
+            "uid": _get_gitea_user_id(),
+            "exclusive": "true",
+            "sort": "updated",
+            "order": "desc",
+            "page": page,
+            "limit": PROJECTS_PAGE_SIZE,
         },
+        headers=headers,
         timeout=5,
     )
-    git_data = git.json()
-    if git_data and len(git_data) > 0:
-        result = git_data[0]
-        _git_data_cache = {"data": result, "timestamp": current_time}
-        return result
+    if response.status_code != HTTP_NOT_MODIFIED:
+        response.raise_for_status()
+    return response
 
-    # Return cached or default
-    if _git_data_cache["data"]:
-        return _git_data_cache["data"]
 
-    return {
-        "repo": {
-            "html_url": "https://nathan.woodburn.au",
-            "name": "nathanwoodburn.github.io",
-            "description": "Personal website",
-        }
-    }
+class Project(NamedTuple):
+    """A project shown on the site, with only the fields it renders."""
+
+    id: int
+    name: str
+    description: str
+    html_url: str
+    avatar_url: str
+    updated_at: str
+
+
+def _compact_project(repo: dict) -> Project:
+    """
+    Build a project record from a Gitea repo, cleaning up its name and avatar.
+    """
+    avatar_url = repo.get("avatar_url")
+    if avatar_url in ("https://git.woodburn.au/", "", None):
+        avatar_url = "/favicon.png"
+    return Project(
+        id=repo.get("id", 0),
+        name=repo["name"].replace("_", " ").replace("-", " "),
+        description=repo.get("description") or "",
+        html_url=repo.get("html_url", ""),
+        avatar_url=avatar_url,
+        updated_at=repo.get("updated_at", ""),
+    )
 
 
-# Cache storage for projects
-_projects_cache = {"data": None, "timestamp": 0}
-_projects_ttl = 7200  # 2 hours cache
+def _merge_projects(
+    projects: list[Project], cached: list[Project] | None = None
+) -> list[Project]:
+    """
+    Sort projects by last updated and merge them into an already sorted list,
+    removing duplicate names (the most recently updated is kept).
+    """
+    # Sort by last updated, only the new projects need sorting
+    updated = attrgetter("updated_at")
+    projects_sorted = heapq.merge(
+        sorted(projects, key=updated, reverse=True),
+        cached or [],
+        key=updated,
+        reverse=True,
+    )
+
+    # Remove duplicates by name
+    seen_names = set()
+    unique_projects = []
+    for project in projects_sorted:
+        if project.name not in seen_names:
+            unique_projects.append(project)
+            seen_names.add(project.name)
+    return unique_projects
+
+
+def _page_projects(response: requests.Response) -> list[Project]:
+    return [_compact_project(repo) for repo in response.json().get("data", [])]
+
+
+def fetch_projects():
+    """
+    Fetch the project list, sorted by last updated with duplicate names removed.
+    Repos are searched most recently updated first, so the first page changes
+    whenever any repo is updated or added and is revalidated with its ETag.
+    Between full syncs only the pages with repos updated since the cached list
+    are fetched, otherwise every page is fetched in parallel.
+
+    Returns:
+        list: List of Project records
+    """
+    global _projects_sync
+    cached = _data_cache["projects"]["data"]
+    current_time = time.time()
+    full_sync = (
+        not cached
+        or _projects_sync["total"] is None
+        or current_time - _projects_sync["full_sync"] >= PROJECTS_FULL_SYNC_INTERVAL
+    )
+
+    first = _fetch_projects_page(1, None if full_sync else _projects_sync["etag"])
+    if first.status_code == HTTP_NOT_MODIFIED:
+        return cached
+
+    projects = _page_projects(first)
+    total = int(first.headers.get("X-Total-Count", len(projects)))
+    pages = min(math.ceil(total / PROJECTS_PAGE_SIZE), PROJECTS_MAX_PAGES)
+    # A repo was added or deleted
+    full_sync = full_sync or total != _projects_sync["total"]
+
+    if full_sync:
+        with ThreadPoolExecutor(max_workers=PROJECTS_FETCH_WORKERS) as pool:
+            for response in pool.map(_fetch_projects_page, range(2, pages + 1)):
+                projects += _page_projects(response)
+        cached = None
+    else:
+        # The search lists repos most recently updated first, so stop at the
+        # first page that reaches repos already in the cached list
+        watermark = cached[0].updated_at
+        page_projects = projects
+        page = 1
+        while page < pages and all(
+            project.updated_at > watermark for project in page_projects
+        ):
+            page += 1
+            page_projects = _page_projects(_fetch_projects_page(page))
+            projects += page_projects
+        updated_ids = {project.id for project in projects}
+        cached = [project for project in cached if project.id not in updated_ids]
+
+    _projects_sync = {
+        "etag": first.headers.get("ETag"),
+        "total": total,
+        "full_sync": current_time if full_sync else _projects_sync["full_sync"],
+    }
+    return _merge_projects(projects, cached)
 
 
 def get_projects(limit=3):
     """
-    Get projects list with caching (2 hour TTL).
+    Get projects list with caching (2 hour TTL, 1 day with webhooks).
+    Cached data is returned immediately and refreshed in the background.
 
     Args:
         limit (int): Number of projects to return
 
     Returns:
-        list: List of project dictionaries
-    """
-    global _projects_cache
-    current_time = datetime.datetime.now(tz=datetime.UTC).timestamp()
-
-    # Check if cache is valid
-    if (
-        _projects_cache["data"]
-        and (current_time - _projects_cache["timestamp"]) < _projects_ttl
-    ):
-        return _projects_cache["data"][:limit]
-
-    # Fetch new data
-    projects = []
-    projectsreq = requests.get(
-        "https://git.woodburn.au/api/v1/users/nathanwoodburn/repos", timeout=5
-    )
-    projects = projectsreq.json()
-
-    # Check for pagination
-    pageNum = 2
-    while 'rel="next"' in projectsreq.headers.get("link", ""):
-        projectsreq = requests.get(
-            f"https://git.woodburn.au/api/v1/users/nathanwoodburn/repos?page={pageNum}",
-            timeout=5,
+        list: List of Project records, empty if none could be fetched
+    """
+    return (_get_data("projects") or [])[:limit]
+
+
+def apply_gitea_event(event: str, payload: dict) -> bool:
+    """
+    Update the git activity and project list from a Gitea webhook event.
+    Only the payload is used, so an event never causes upstream requests.
+    Private repos are left out of both.
+
+    Args:
+        event (str): The X-Gitea-Event header (push or repository)
+        payload (dict): The event payload
+
+    Returns:
+        bool: True if the cached data was updated
+    """
+    repo = payload.get("repository")
+    if event not in ("push", "repository") or not isinstance(repo, dict):
+        return False
+    owner = (repo.get("owner") or {}).get("login", "")
+    if owner.lower() != GITEA_USER:
+        return False
+
+    # Held so a background refresh can't interleave with the update
+    with _data_lock:
+        return _apply_gitea_repo_event(event, payload, repo)
+
+
+def _apply_gitea_repo_event(event: str, payload: dict, repo: dict) -> bool:
+    updated = False
+    pusher = (payload.get("pusher") or {}).get("login", "")
+    if event == "push" and pusher.lower() == GITEA_USER and not repo.get("private"):
+        _store(
+            "git",
+            {
+                "op_type": "commit_repo",
+                "ref_name": payload.get("ref", ""),
+                "repo": repo,
+            },
         )
-        projects += projectsreq.json()
-        pageNum += 1
-        # Safety limit
-        if pageNum > 10:
-            break
-
-    # Process projects
-    for project in projects:
-        if project.get("avatar_url") in ("https://git.woodburn.au/", ""):
-            project["avatar_url"] = "/favicon.png"
-        project["name"] = project["name"].replace("_", " ").replace("-", " ")
-
-    # Sort by last updated
-    projects_sorted = sorted(
-        projects, key=lambda x: x.get("updated_at", ""), reverse=True
+        updated = True
+
+    # Update the cached list in place, a poll will load it if there isn't one
+    projects = _data_cache["projects"]["data"]
+    if projects is not None:
+        remaining = [project for project in projects if project.id != repo.get("id")]
+        if repo.get("private") or (
+            event == "repository" and payload.get("action") == "deleted"
+        ):
+            _store("projects", remaining)
+        else:
+            _store("projects", _merge_projects([_compact_project(repo)], remaining))
+        updated = True
+    return updated
+
+
+def get_project_list() -> tuple[list[Project], str]:
+    """
+    Get the full cached project list, most recently updated first.
+
+    Returns:
+        Tuple[list, str]: The Project records and a version that changes
+            whenever the list's contents change
+    """
+    global _projects_version
+    projects = _get_data("projects") or []
+    version = _projects_version
+    if version["data"] is not projects:
+        digest = hashlib.sha256(repr(projects).encode("utf-8")).hexdigest()[:16]
+        version = {"data": projects, "version": digest}
+        _projects_version = version
+    return projects, version["version"]
+
+
+# Cached API data kept fresh by the background refresher:
+# name -> (TTL, fetch function)
+_refreshed_caches = {
+    "git": (_git_data_ttl, fetch_git_latest_activity),
+    "projects": (_projects_ttl, fetch_projects),
+}
+# Time of the last fetch that failed or returned nothing, per entry
+_empty_fetches = dict.fromkeys(_refreshed_caches, 0.0)
+_refresh_event = threading.Event()
+_refresh_thread = {"pid": None, "thread": None}
+_refresh_thread_lock = threading.Lock()
+
+
+def _is_stale(name: str) -> bool:
+    ttl, _ = _refreshed_caches[name]
+    age = time.time() - _data_cache[name]["timestamp"]
+    return age >= ttl * CACHE_REFRESH_AHEAD
+
+
+def _load_shared(name: str) -> bool:
+    """
+    Use the shared copy of an entry if another worker fetched it more recently.
+
+    Returns:
+        bool: True if the local copy was updated
+    """
+    entry = get_shared(f"data:{name}")
+    with _data_lock:
+        if entry is None or entry[1] <= _data_cache[name]["timestamp"]:
+            return False
+        _data_cache[name] = {
+            "data": _decode_data(name, entry[0]),
+            "timestamp": entry[1],
+        }
+    return True
+
+
+def _decode_data(name: str, data):
+    """
+    Convert an entry loaded from JSON (the shared cache or a snapshot) back
+    to the form it's cached in.
+    """
+    if name == "projects":
+        # Records are stored as lists, older copies as Gitea repo dicts
+        return [
+            _compact_project(project)
+            if isinstance(project, dict)
+            else Project(*project)
+            for project in data
+        ]
+    return data
+
+
+def _store(name: str, data, fetched_at: float | None = None) -> bool:
+    """
+    Store an entry locally and in the shared cache.
+
+    Args:
+        name (str): The entry name
+        data (Any): The entry data
+        fetched_at (Optional[float]): When the fetch that produced the data
+            started. It's discarded if the entry was updated since (e.g. by a
+            webhook), so a slow fetch can't overwrite newer data
+
+    Returns:
+        bool: True if the data was stored
+    """
+    with _data_lock:
+        if fetched_at is not None:
+            _load_shared(name)
+            if _data_cache[name]["timestamp"] > fetched_at:
+                return False
+        current_time = time.time()
+        _data_cache[name] = {"data": data, "timestamp": current_time}
+        set_shared(f"data:{name}", data, current_time)
+    return True
+
+
+def refresh_data(name: str, force: bool = False):
+    """
+    Refresh a cached API data entry if it's due.
+    Only one worker fetches an entry at a time, the rest pick up its result
+    from the cache backend.
+
+    Args:
+        name (str): The entry name (git or projects)
+        force (bool): Fetch even if the entry isn't due
+    """
+    _load_shared(name)
+    if not force and _data_cache[name]["data"] is not None and not _is_stale(name):
+        return
+
+    lease = f"refresh:{name}"
+    if not acquire_lease(lease, CACHE_REFRESH_LEASE):
+        return
+    try:
+        _fetch_data(name)
+    finally:
+        release_lease(lease)
+
+
+@single_flight()
+def _fetch_data(name: str):
+    """
+    Fetch an entry and store it. Threads fetching the same entry at once
+    share one upstream request.
+    """
+    _, fetch = _refreshed_caches[name]
+    fetched_at = time.time()
+    data = fetch()
+    if data is not None and not _store(name, data, fetched_at):
+        # Updated while fetching, keep the newer data
+        return _data_cache[name]["data"]
+    return data
+
+
+def _get_data(name: str):
+    start_background_refresh()
+    cache = _data_cache[name]
+    if cache["data"] is None and not _load_shared(name):
+        # Don't retry an empty or failed fetch on every request
+        if time.time() - _empty_fetches[name] < CACHE_NEGATIVE_TTL:
+            return None
+        # Nothing cached yet, so this request has to wait for the fetch
+        try:
+            data = _fetch_data(name)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Warning: Failed to fetch {name} data: {e}", flush=True)
+            data = None
+        if data is None:
+            _empty_fetches[name] = time.time()
+    elif _is_stale(name):
+        _refresh_event.set()
+    return _data_cache[name]["data"]
+
+
+def _refresh_loop():
+    while True:
+        for name in _refreshed_caches:
+            # Only keep data fresh once something has asked for it
+            if _data_cache[name]["data"] is None:
+                continue
+            try:
+                # Pick up webhook updates received by other workers
+                _load_shared(name)
+                if _is_stale(name):
+                    refresh_data(name)
+            except http_client.CircuitOpenError:
+                # Keep serving the cached data until the upstream recovers
+                continue
+            except Exception as e:  # noqa: BLE001 - one bad payload mustn't stop the loop
+                print(f"Warning: Failed to refresh {name} cache: {e!r}", flush=True)
+        _refresh_event.wait(CACHE_REFRESH_INTERVAL)
+        _refresh_event.clear()
+
+
+def _is_refresh_running() -> bool:
+    thread = _refresh_thread["thread"]
+    return (
+        _refresh_thread["pid"] == os.getpid()
+        and thread is not None
+        and thread.is_alive()
     )
 
-    # Remove duplicates by name
-    seen_names = set()
-    unique_projects = []
-    for project in projects_sorted:
-        if project["name"] not in seen_names:
-            unique_projects.append(project)
-            seen_names.add(project["name"])
 
-    _projects_cache = {"data": unique_projects, "timestamp": current_time}
-    return unique_projects[:limit]
+def start_background_refresh():
+    """
+    Start the thread that refreshes cached API data before it expires.
+    Threads don't survive a fork, so each worker process starts its own, and
+    it's started again if it has stopped.
+    """
+    if _is_refresh_running():
+        return
+    with _refresh_thread_lock:
+        if _is_refresh_running():
+            return
+        thread = threading.Thread(
+            target=_refresh_loop, name="cache-refresh", daemon=True
+        )
+        thread.start()
+        _refresh_thread["pid"] = os.getpid()
+        _refresh_thread["thread"] = thread
+
+
+def _dump_data_cache() -> dict:
+    return {
+        name: dict(cache)
+        for name, cache in _data_cache.items()
+        if cache["data"] is not None
+    }
+
+
+def _load_data_cache(snapshot: dict):
+    for name, cache in snapshot.items():
+        with _data_lock:
+            if (
+                name in _data_cache
+                and cache["timestamp"] > _data_cache[name]["timestamp"]
+            ):
+                _data_cache[name] = {
+                    "data": _decode_data(name, cache["data"]),
+                    "timestamp": cache["timestamp"],
+                }
+
+
+register_snapshot("data", _dump_data_cache, _load_data_cache)
+
+
+def get_data_cache_stats() -> dict:
+    """
+    Get the age of each cached API data entry for this worker.
+
+    Returns:
+        dict: name -> age in seconds (None if not loaded), TTL and fetch time
+    """
+    current_time = time.time()
+    stats = {}
+    for name, (ttl, _) in _refreshed_caches.items():
+        cache = _data_cache[name]
+        loaded = cache["data"] is not None
+        stats[name] = {
+            "age": round(current_time - cache["timestamp"], 3) if loaded else None,
+            "ttl": ttl,
+            "timestamp": cache["timestamp"] if loaded else None,
+        }
+    return stats
 
 
 # Cached wallet data loaders
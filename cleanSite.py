@@ -1,23 +1,19 @@
 import os
 
 
-def cleanSite(path: str):
-    # Check if the file is sitemap.xml
+def cleanContent(path: str, content: str) -> str:
+    # Remove .html from every URL in the sitemap
     if path.endswith("sitemap.xml"):
-        # Open the file
-        with open(path, "r") as f:
-            # Read the content
-            content = f.read()
-        # Replace all .html with empty string
-        content = content.replace(".html", "")
-        # Write the content back to the file
-        with open(path, "w") as f:
-            f.write(content)
-        # Skip the file
-        return
+        return content.replace(".html", "")
+    # Remove .html from links in html files
+    if path.endswith(".html"):
+        return content.replace('.html"', '"')
+    return content
 
-    # If the file is not an html file, skip it
-    if not path.endswith(".html"):
+
+def cleanSite(path: str):
+    # If the file is not an html file or sitemap, skip it
+    if not path.endswith((".html", "sitemap.xml")):
         if os.path.isdir(path):
             for file in os.listdir(path):
                 cleanSite(path + "/" + file)
@@ -27,11 +23,12 @@ def cleanSite(path: str):
     # Open the file
     with open(path, "r") as f:
         # Read and remove all .html
-        content = f.read().replace('.html"', '"')
+        content = cleanContent(path, f.read())
     # Write the cleaned content back to the file
     with open(path, "w") as f:
         f.write(content)
 
 
-for file in os.listdir("templates"):
-    cleanSite("templates/" + file)
+if __name__ == "__main__":
+    for file in os.listdir("templates"):
+        cleanSite("templates/" + file)
@@ -1,8 +1,9 @@
 import os
 from functools import lru_cache
 
-from flask import render_template, send_file
+from flask import render_template
 
+from assets import deliver_file
 from blueprints.spotify import get_playing_spotify_track
 from cache_helper import get_git_latest_activity
 from cache_helper import get_projects as get_projects_cached
@@ -43,8 +44,8 @@ def get_projects():
     projects_data = get_projects_cached(limit=5)
     projects = ""
     for project in projects_data:
-        projects += f"""\x1b[1m{project["name"]}\x1b[0m - {project["description"] if project["description"] else "No description"}
-{project["html_url"]}
+        projects += f"""\x1b[1m{project.name}\x1b[0m - {project.description or "No description"}
+{project.html_url}
 
 """
     return projects
@@ -127,7 +128,7 @@ def curl_response(request):
         )
 
     if path == "pgp" or path == "gpg":
-        return send_file("data/nathanwoodburn.asc")
+        return deliver_file(request, "data/nathanwoodburn.asc")
     if os.path.exists(f"templates/{path}.ascii"):
         return (
             render_template(f"{path}.ascii", header=get_header()),
@@ -0,0 +1,245 @@
+"""
+Static export module.
+Renders every servable page, terminal (curl) variant, feed and wallet QR
+code to a directory, along with the assets under their plain and
+fingerprinted names. A web server can then serve almost all traffic directly
+and only pass the dynamic routes (/api/v1/*, /hosting/send-enquiry, /spotify)
+and raster images, which are resized and converted per request, to Flask.
+See the README for an example nginx config. Pages are rendered in parallel
+across CPU cores.
+
+Run `python3 export.py <dir>` to export the site.
+"""
+
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from assets import asset_url, list_asset_paths
+from blueprints import blog
+from cache_helper import get_wallet_tokens
+from cleanSite import cleanContent
+from sitemap import SITE_URL, list_sitemap_entries
+
+HTTP_OK = 200
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", str(os.cpu_count() or 1)))
+# User agent used to render the terminal (.ascii) variants
+EXPORT_CLI_AGENT = "curl/8.0.0"
+
+# Pages that aren't in the sitemap
+EXPORT_PAGES = ["/403", "/404", "/resume"]
+# Feeds and generated files, written under their request path
+EXPORT_FILES = [
+    "/sitemap.xml",
+    "/now.rss",
+    "/now.xml",
+    "/rss.xml",
+    "/now.json",
+    "/manifest.json",
+    "/sw.js",
+    "/resume.pdf",
+    "/download/pgp",
+]
+# Terminal variants (written as <path>.ascii). The index and spotify pages
+# show the client's IP and live data so are left to Flask.
+EXPORT_CLI_PAGES = ["/projects", "/donate", "/donate/more", "/tools", "/now"]
+EXPORT_CLI_SKIP = ["error", "header", "index", "spotify"]
+WALLET_DIR = ".well-known/wallets"
+
+# Test client for each worker process
+_client = None
+
+
+def list_export_urls() -> list[tuple[str, bool]]:
+    """
+    Get every URL to export.
+
+    Returns:
+        list: (url, cli) tuples, where cli requests the terminal variant
+    """
+    urls = [path for path, _ in list_sitemap_entries()] + EXPORT_PAGES
+    urls += [f"/blog/{page}.md" for page in blog.list_page_files()]
+    urls += EXPORT_FILES
+    urls += [f"/address/{address}" for address in list_wallet_addresses()]
+    exports = [(url, False) for url in urls]
+
+    cli_pages = list(EXPORT_CLI_PAGES)
+    cli_pages += [
+        f"/{file.removesuffix('.ascii')}"
+        for file in sorted(os.listdir("templates"))
+        if file.endswith(".ascii")
+        and not file.startswith("donate")
+        and file.removesuffix(".ascii") not in EXPORT_CLI_SKIP
+    ]
+    cli_pages += [f"/donate/{coin.lower()}" for coin in list_wallet_coins()]
+    exports += [(url, True) for url in dict.fromkeys(cli_pages)]
+    return exports
+
+
+def list_wallet_coins() -> list[str]:
+    """
+    Get the coins with a wallet address file.
+
+    Returns:
+        list: Coin symbols
+    """
+    return sorted(file for file in os.listdir(WALLET_DIR) if not file.startswith("."))
+
+
+def list_wallet_addresses() -> list[str]:
+    """
+    Get every wallet address shown on the donate page.
+
+    Returns:
+        list: Unique wallet addresses
+    """
+    addresses = []
+    for coin in list_wallet_coins():
+        with open(os.path.join(WALLET_DIR, coin)) as file:
+            addresses.append(file.read())
+    addresses += [
+        token["address"] for token in get_wallet_tokens() if "address" in token
+    ]
+    return list(dict.fromkeys(address for address in addresses if address))
+
+
+def get_output_path(url: str, cli: bool, mimetype: str) -> str:
+    """
+    Get the file a URL is exported to, relative to the export directory.
+    HTML pages get a .html extension and terminal variants a .ascii extension.
+
+    Args:
+        url (str): The request path
+        cli (bool): Whether this is the terminal variant
+        mimetype (str): The response mimetype
+
+    Returns:
+        str: The relative output path
+    """
+    path = url.strip("/") or "index"
+    if cli:
+        return path + ".ascii"
+    if mimetype == "text/html" and not path.endswith(".html"):
+        return path + ".html"
+    return path
+
+
+def _init_worker():
+    global _client
+    # Imported per worker so each process has its own app
+    import assets
+    from server import app
+
+    # Export the file contents rather than proxy offload headers
+    assets.SENDFILE_MODE = ""
+    _client = app.test_client()
+
+
+def export_url(
+    output_dir: str, url: str, cli: bool
+) -> tuple[str, str | None, str | None]:
+    """
+    Render a URL and write it to the export directory.
+
+    Args:
+        output_dir (str): The export directory
+        url (str): The request path
+        cli (bool): Whether to render the terminal variant
+
+    Returns:
+        Tuple[str, Optional[str], Optional[str]]: The URL, output path and error
+    """
+    headers = {"User-Agent": EXPORT_CLI_AGENT} if cli else {}
+    response = _client.get(url, base_url=SITE_URL, headers=headers)
+    if response.status_code != HTTP_OK:
+        return url, None, f"HTTP {response.status_code}"
+
+    output = get_output_path(url, cli, response.mimetype)
+    data = response.get_data()
+    if output.endswith((".html", "sitemap.xml")):
+        data = cleanContent(output, data.decode("utf-8")).encode("utf-8")
+
+    full_path = os.path.join(output_dir, output)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "wb") as f:
+        f.write(data)
+    return url, output, None
+
+
+def _link_file(source: str, destination: str):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def export_assets(output_dir: str) -> int:
+    """
+    Link every asset into the export directory under its plain and
+    fingerprinted paths, along with any precompressed variants.
+
+    Args:
+        output_dir (str): The export directory
+
+    Returns:
+        int: Number of asset paths exported
+    """
+    paths = list_asset_paths()
+    for path, asset in paths.items():
+        fingerprinted = asset_url(path).removeprefix("/")
+        for name in dict.fromkeys(["assets/" + path, fingerprinted]):
+            destination = os.path.join(output_dir, name)
+            _link_file(asset.path, destination)
+            for _, variant in asset.encodings:
+                extension = os.path.splitext(variant)[1]
+                _link_file(variant, destination + extension)
+    return len(paths)
+
+
+def export_site(output_dir: str, workers: int = EXPORT_WORKERS) -> tuple[int, int]:
+    """
+    Export the site to a directory.
+
+    Args:
+        output_dir (str): The export directory
+        workers (int): Number of render processes
+
+    Returns:
+        Tuple[int, int]: Number of files exported and number of failures
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    count = export_assets(output_dir)
+
+    exports = list_export_urls()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        results = pool.map(
+            export_url,
+            [output_dir] * len(exports),
+            [url for url, _ in exports],
+            [cli for _, cli in exports],
+            chunksize=max(1, len(exports) // (workers * 4)),
+        )
+        for url, _, error in results:
+            if error:
+                print(f"Warning: Failed to export {url}: {error}")
+                failures += 1
+            else:
+                count += 1
+    return count, failures
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the site to static files.")
+    parser.add_argument("output", type=str, help="Directory to export to")
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS)
+    args = parser.parse_args()
+
+    print(f"Exporting site to {args.output} with {args.workers} workers...")
+    count, failures = export_site(args.output, args.workers)
+    print(f"Exported {count} files ({failures} failed).")
@@ -0,0 +1,286 @@
+"""
+Icon font optimisation module for templates/assets/fonts.
+Subsets the icon fonts to the glyphs the site actually uses, converts them to
+WOFF2 and writes matching stylesheets that only contain the used icon rules.
+The output in templates/assets/fonts/optimised replaces the original fonts
+and stylesheets when it exists (see ASSET_OVERRIDES in assets.py).
+
+Run `python3 fonts.py --build` to generate the optimised fonts.
+This needs fontTools and brotli, which are only required at build time.
+"""
+
+import glob
+import hashlib
+import io
+import os
+import re
+import shutil
+
+from assets import ASSET_ROOT, FINGERPRINT_LENGTH
+
+try:
+    import brotli
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+except ImportError:  # Only needed to build the optimised fonts
+    brotli = subset = TTFont = None
+
+FONT_DIR = os.path.join(ASSET_ROOT, "fonts")
+FONT_OUTPUT_DIR = os.path.join(FONT_DIR, "optimised")
+# Font formats that can be used as the subsetting source, in order of preference
+FONT_SOURCE_EXTENSIONS = (".ttf", ".otf", ".woff2", ".woff")
+
+# Files scanned for icon classes and literal icon characters
+FONT_USAGE_DIRS = ["templates", "data", "blueprints"]
+FONT_USAGE_EXTENSIONS = (
+    ".ascii",
+    ".css",
+    ".finger",
+    ".html",
+    ".js",
+    ".json",
+    ".md",
+    ".py",
+    ".txt",
+)
+# Unicode private use area, where icon fonts put their glyphs
+PRIVATE_USE_AREA = range(0xE000, 0xF900)
+
+USAGE_WORD_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+USAGE_ESCAPE_PATTERN = re.compile(r"&#x([0-9a-fA-F]+);|\\u([0-9a-fA-F]{4})")
+# Innermost CSS rules, so rules nested in @media blocks are matched too
+CSS_RULE_PATTERN = re.compile(r"(?P<selectors>[^{}]+)\{(?P<body>[^{}]*)\}")
+# Comments, @charset and block openings that end up in front of a selector
+CSS_PREFIX_PATTERN = re.compile(r"(?s)^(?P<prefix>.*(?:\*/|;))?(?P<selectors>.*)$")
+CSS_CLASS_PATTERN = re.compile(r"\.([A-Za-z0-9_-]+)")
+CSS_PSEUDO_PATTERN = re.compile(r"::?(?:before|after)\s*$")
+CSS_CONTENT_PATTERN = re.compile(r"content:\s*([\"'])\\([0-9a-fA-F]+)\1")
+CSS_URL_PATTERN = re.compile(r"url\(\s*([\"']?)(?P<url>[^\"')]+)\1\s*\)")
+
+
+def scan_font_usage() -> tuple[set[str], set[int]]:
+    """
+    Find every word and literal icon character used by the site.
+    Words are matched against the icon class names in the stylesheets.
+
+    Returns:
+        Tuple[set, set]: The words and private use codepoints found
+    """
+    words = set()
+    codepoints = set()
+    for directory in FONT_USAGE_DIRS:
+        for root, dirs, filenames in os.walk(directory):
+            # Don't count the icon stylesheets themselves
+            dirs[:] = [d for d in dirs if os.path.join(root, d) != FONT_DIR]
+            for filename in filenames:
+                if filename.endswith(FONT_USAGE_EXTENSIONS):
+                    _scan_file(os.path.join(root, filename), words, codepoints)
+    for path in glob.glob("*.py"):
+        _scan_file(path, words, codepoints)
+    return words, codepoints
+
+
+def _scan_file(path: str, words: set[str], codepoints: set[int]):
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+    words.update(USAGE_WORD_PATTERN.findall(text))
+    codepoints.update(ord(char) for char in text if ord(char) in PRIVATE_USE_AREA)
+    for match in USAGE_ESCAPE_PATTERN.finditer(text):
+        codepoints.add(int(match.group(1) or match.group(2), 16))
+
+
+def _split_selectors(selectors: str) -> tuple[str, list[str]]:
+    match = CSS_PREFIX_PATTERN.match(selectors)
+    return match.group("prefix") or "", match.group("selectors").split(",")
+
+
+def _is_used_selector(selector: str, words: set[str]) -> bool:
+    """
+    Check if a selector should be kept.
+    Icon selectors (.fa-github:before) are only kept if all their classes are used.
+    """
+    if not CSS_PSEUDO_PATTERN.search(selector):
+        return True
+    return all(name in words for name in CSS_CLASS_PATTERN.findall(selector))
+
+
+def prune_stylesheet(css: str, words: set[str]) -> tuple[str, set[int]]:
+    """
+    Remove icon rules for classes the site doesn't use.
+
+    Args:
+        css (str): The stylesheet
+        words (set): Words used by the site, from scan_font_usage
+
+    Returns:
+        Tuple[str, set]: The pruned stylesheet and the icon codepoints it still uses
+    """
+    codepoints = set()
+
+    def replace(match: re.Match) -> str:
+        prefix, selectors = _split_selectors(match.group("selectors"))
+        selectors = [s for s in selectors if _is_used_selector(s, words)]
+        if not selectors:
+            return prefix
+        body = match.group("body")
+        codepoints.update(int(cp, 16) for _, cp in CSS_CONTENT_PATTERN.findall(body))
+        return f"{prefix}{','.join(selectors)}{{{body}}}"
+
+    return CSS_RULE_PATTERN.sub(replace, css), codepoints
+
+
+def _is_font_face(selectors: str) -> bool:
+    _, selectors = _split_selectors(selectors)
+    return selectors[0].strip() == "@font-face"
+
+
+def find_font_source(body: str) -> str | None:
+    """
+    Pick the font file to subset from an @font-face rule.
+
+    Args:
+        body (str): The @font-face declarations
+
+    Returns:
+        Optional[str]: The font filename, or None if there's no usable source
+    """
+    filenames = [
+        os.path.basename(match.group("url").split("?")[0].split("#")[0])
+        for match in CSS_URL_PATTERN.finditer(body)
+    ]
+    for extension in FONT_SOURCE_EXTENSIONS:
+        for filename in filenames:
+            if filename.endswith(extension) and os.path.isfile(
+                os.path.join(FONT_DIR, filename)
+            ):
+                return filename
+    return None
+
+
+def rewrite_font_faces(css: str, urls: dict[str, str]) -> str:
+    """
+    Point @font-face rules at the WOFF2 subsets only.
+
+    Args:
+        css (str): The stylesheet
+        urls (dict): Source font filename -> subset URL
+
+    Returns:
+        str: The stylesheet with rewritten @font-face rules
+    """
+
+    def replace(match: re.Match) -> str:
+        body = match.group("body")
+        source = find_font_source(body)
+        if not _is_font_face(match.group("selectors")) or source not in urls:
+            return match.group(0)
+        declarations = [
+            d for d in body.split(";") if d.strip() and not d.strip().startswith("src")
+        ]
+        declarations.append(f"src:url('{urls[source]}') format('woff2')")
+        # Icon fonts have no sensible fallback, so don't render one while loading
+        if not any(d.strip().startswith("font-display") for d in declarations):
+            declarations.append("font-display:block")
+        return f"{match.group('selectors')}{{{';'.join(declarations)}}}"
+
+    return CSS_RULE_PATTERN.sub(replace, css)
+
+
+def subset_font(full_path: str, codepoints: set[int]) -> bytes:
+    """
+    Subset a font to the given codepoints and convert it to WOFF2.
+
+    Args:
+        full_path (str): The source font path
+        codepoints (set): The codepoints to keep
+
+    Returns:
+        bytes: The WOFF2 font data
+    """
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = ["*"]
+    options.notdef_outline = True
+    options.drop_tables += ["FFTM"]
+
+    font = TTFont(full_path)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+
+    output = io.BytesIO()
+    font.flavor = "woff2"
+    font.save(output)
+    font.close()
+    return output.getvalue()
+
+
+def _write_output(filename: str, data: bytes):
+    path = os.path.join(FONT_OUTPUT_DIR, filename)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_fonts() -> dict[str, tuple[int, int]]:
+    """
+    Write subset WOFF2 fonts and pruned stylesheets to FONT_OUTPUT_DIR.
+    Every stylesheet in FONT_DIR gets an optimised copy. Fonts are subset to
+    every icon codepoint used across the stylesheets, as some stylesheets
+    (e.g. fontawesome5-overrides) use fonts declared in another one.
+
+    Returns:
+        dict: Output filename -> (original size, optimised size)
+    """
+    words, codepoints = scan_font_usage()
+    stylesheets = {}
+    sources = set()
+    for path in sorted(glob.glob(os.path.join(FONT_DIR, "*.css"))):
+        with open(path, encoding="utf-8") as f:
+            css = f.read()
+        css, used = prune_stylesheet(css, words)
+        codepoints |= used
+        stylesheets[path] = css
+        for match in CSS_RULE_PATTERN.finditer(css):
+            if _is_font_face(match.group("selectors")):
+                source = find_font_source(match.group("body"))
+                if source:
+                    sources.add(source)
+
+    # Start from scratch so removed fonts don't linger
+    shutil.rmtree(FONT_OUTPUT_DIR, ignore_errors=True)
+    os.makedirs(FONT_OUTPUT_DIR)
+
+    results = {}
+    urls = {}
+    for source in sorted(sources):
+        full_path = os.path.join(FONT_DIR, source)
+        data = subset_font(full_path, codepoints)
+        filename = os.path.splitext(source)[0] + ".woff2"
+        _write_output(filename, data)
+        # Fingerprinted so the fonts can be cached as immutable
+        digest = hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]
+        base = os.path.splitext(filename)[0]
+        urls[source] = f"../fonts/{base}.{digest}.woff2"
+        results[filename] = (os.path.getsize(full_path), len(data))
+
+    for path, css in stylesheets.items():
+        data = rewrite_font_faces(css, urls).encode("utf-8")
+        filename = os.path.basename(path)
+        _write_output(filename, data)
+        results[filename] = (os.path.getsize(path), len(data))
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--build" in sys.argv or "-b" in sys.argv:
+        if subset is None or brotli is None:
+            print("Error: fontTools and brotli are required to build WOFF2 fonts")
+            sys.exit(1)
+        print("Building optimised fonts...")
+        for filename, (original, optimised) in build_fonts().items():
+            print(f"  {filename}: {original} -> {optimised} bytes")
+        print(f"Wrote optimised fonts to {FONT_OUTPUT_DIR}.")
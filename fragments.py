@@ -0,0 +1,138 @@
+"""
+Fragment cache module for expensive template sections.
+Provides a {% cache %} Jinja tag backed by an in-process LRU:
+
+    {% cache "projects", 3600, "projects" %}...{% endcache %}
+
+The arguments are the fragment key, an optional TTL in seconds (None to keep
+it until a dependency changes) and the names of the data it depends on.
+A fragment is re-rendered when its TTL expires or any dependency's version
+changes. Per-request parts of the page stay outside the tag.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from tools import SITES_FILE, get_mtime
+
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "512"))
+
+
+# Dependency name -> function returning a value that changes with the data
+FRAGMENT_DEPENDENCIES = {
+    # get_sites reloads the file when its mtime changes
+    "sites": lambda: get_mtime(SITES_FILE),
+    "tools": lambda: get_mtime("data/tools.json"),
+}
+
+
+class Fragment(NamedTuple):
+    """A rendered template fragment."""
+
+    expires: float | None
+    versions: tuple
+    html: str
+
+
+# LRU fragment cache storage: (template, key) -> Fragment
+_fragment_cache: OrderedDict[tuple, Fragment] = OrderedDict()
+_fragment_lock = threading.Lock()
+
+
+def register_dependency(name: str, version):
+    """
+    Register data that fragments can depend on.
+
+    Args:
+        name (str): The dependency name used in {% cache %} tags
+        version (Callable): Function returning a value that changes with the data
+    """
+    FRAGMENT_DEPENDENCIES[name] = version
+
+
+def get_dependency_versions(dependencies: list[str]) -> tuple:
+    """
+    Get the current version of each dependency.
+
+    Args:
+        dependencies (list): Dependency names
+
+    Returns:
+        tuple: The versions, in the same order
+    """
+    versions = []
+    for name in dependencies:
+        version = FRAGMENT_DEPENDENCIES.get(name)
+        if version is None:
+            raise KeyError(f"Unknown fragment cache dependency: {name}")
+        versions.append(version())
+    return tuple(versions)
+
+
+def get_fragment(key: tuple, ttl: float | None, dependencies: list[str], render) -> str:
+    """
+    Get a rendered fragment from the cache, rendering and storing it on a miss.
+
+    Args:
+        key (tuple): The cache key
+        ttl (Optional[float]): Seconds to keep the fragment, or None for no expiry
+        dependencies (list): Names of the data the fragment depends on
+        render (Callable): Function returning the fragment HTML
+
+    Returns:
+        str: The fragment HTML
+    """
+    versions = get_dependency_versions(dependencies)
+    current_time = time.time()
+    with _fragment_lock:
+        fragment = _fragment_cache.get(key)
+        if (
+            fragment is not None
+            and fragment.versions == versions
+            and (fragment.expires is None or fragment.expires > current_time)
+        ):
+            _fragment_cache.move_to_end(key)
+            return fragment.html
+
+    html = render()
+    expires = current_time + ttl if ttl is not None else None
+    with _fragment_lock:
+        _fragment_cache[key] = Fragment(expires, versions, html)
+        _fragment_cache.move_to_end(key)
+        while len(_fragment_cache) > FRAGMENT_CACHE_SIZE:
+            _fragment_cache.popitem(last=False)
+    return html
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Jinja extension adding the {% cache key, ttl, *dependencies %} tag.
+    """
+
+    tags = frozenset({"cache"})
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        if len(args) < 2:
+            args.append(nodes.Const(None))
+
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method(
+            "_cache",
+            [nodes.Const(parser.name), args[0], args[1], nodes.List(args[2:])],
+        )
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _cache(self, template, key, ttl, dependencies, caller):
+        html = get_fragment((template, key), ttl, dependencies, caller)
+        return Markup(html)
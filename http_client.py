@@ -0,0 +1,265 @@
+"""
+HTTP client module for outbound requests.
+Every upstream call goes through one requests session per worker, so
+connections are kept alive and reused per host. Requests get a default
+timeout, connection errors and 502/503/504 responses to idempotent requests
+are retried, and latency and errors are recorded per upstream host.
+
+Calls to the site's own upstreams opt in to a circuit breaker with
+breaker=True. After CIRCUIT_BREAKER_THRESHOLD consecutive failures, calls fail
+straight away with CircuitOpenError for CIRCUIT_BREAKER_RESET seconds, then a
+single trial call decides whether to close it again. An outage then adds no
+latency. Breakers are kept per origin (scheme, host and port) and only
+opted-in calls count towards them, so requests to user supplied URLs can't
+open them.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_POOL_HOSTS = 16  # Number of hosts to keep connections open to
+HTTP_POOL_SIZE = 8  # Connections kept alive per host
+HTTP_RETRY_STATUSES = (502, 503, 504)
+HTTP_SERVER_ERROR = 500
+# Latency histogram bucket upper bounds in seconds
+HTTP_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Hosts tracked separately, the rest are counted as "other"
+HTTP_METRICS_MAX_HOSTS = 50
+
+# Consecutive failures before the breaker opens
+CIRCUIT_BREAKER_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", "3"))
+# Seconds the breaker stays open before a trial call
+CIRCUIT_BREAKER_RESET = float(os.getenv("CIRCUIT_BREAKER_RESET", "30"))
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+# Session for this worker
+_session = {"pid": None, "session": None}
+_session_lock = threading.Lock()
+
+# Per upstream host metrics
+_upstream_stats: dict[str, dict] = {}
+_upstream_stats_lock = threading.Lock()
+
+# Circuit breaker state: origin -> {"failures", "opened", "trial"}
+_breakers: dict[str, dict] = {}
+_breakers_lock = threading.Lock()
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    # Don't carry cookies from one upstream call to the next
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    retry = Retry(
+        total=HTTP_RETRIES,
+        read=0,
+        backoff_factor=0.2,
+        status_forcelist=HTTP_RETRY_STATUSES,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Get the shared session for this worker.
+    Sockets can't be shared across a fork, so each process creates its own.
+
+    Returns:
+        requests.Session: The session
+    """
+    pid = os.getpid()
+    if _session["pid"] != pid:
+        with _session_lock:
+            if _session["pid"] != pid:
+                _session["session"] = _create_session()
+                _session["pid"] = pid
+    return _session["session"]
+
+
+def _record(host: str, seconds: float, error: bool):
+    with _upstream_stats_lock:
+        if (
+            host not in _upstream_stats
+            and len(_upstream_stats) >= HTTP_METRICS_MAX_HOSTS
+        ):
+            host = "other"
+        stats = _upstream_stats.get(host)
+        if stats is None:
+            stats = {
+                "requests": 0,
+                "errors": 0,
+                "seconds": 0.0,
+                "short_circuited": 0,
+                "buckets": [0] * (len(HTTP_LATENCY_BUCKETS) + 1),
+            }
+            _upstream_stats[host] = stats
+        stats["requests"] += 1
+        stats["errors"] += error
+        stats["seconds"] += seconds
+        stats["buckets"][bisect_left(HTTP_LATENCY_BUCKETS, seconds)] += 1
+
+
+def _get_origin(url: str) -> str:
+    parsed = urlparse(url)
+    port = parsed.port or {"http": 80, "https": 443}.get(parsed.scheme)
+    return f"{parsed.scheme}://{parsed.hostname or ''}:{port}"
+
+
+def _allow_request(origin: str) -> bool:
+    with _breakers_lock:
+        breaker = _breakers.setdefault(
+            origin, {"failures": 0, "opened": 0.0, "trial": False}
+        )
+        if breaker["failures"] < CIRCUIT_BREAKER_THRESHOLD:
+            return True
+        # Open, let one trial call through once the reset time has passed
+        if (
+            not breaker["trial"]
+            and time.time() - breaker["opened"] >= CIRCUIT_BREAKER_RESET
+        ):
+            breaker["trial"] = True
+            return True
+        return False
+
+
+def _record_result(origin: str, error: bool):
+    with _breakers_lock:
+        breaker = _breakers[origin]
+        breaker["trial"] = False
+        if not error:
+            breaker["failures"] = 0
+            return
+        breaker["failures"] += 1
+        if breaker["failures"] >= CIRCUIT_BREAKER_THRESHOLD:
+            breaker["opened"] = time.time()
+
+
+def get_circuit_state(url: str) -> str | None:
+    """
+    Get the state of the circuit breaker for a URL's origin.
+
+    Args:
+        url (str): A URL on the upstream, e.g. https://git.woodburn.au
+
+    Returns:
+        Optional[str]: closed, open or half-open, or None if no call to the
+            origin has used a breaker
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(_get_origin(url))
+        if breaker is None:
+            return None
+        if breaker["failures"] < CIRCUIT_BREAKER_THRESHOLD:
+            return "closed"
+        if breaker["trial"]:
+            return "half-open"
+        return "open"
+
+
+def request(
+    method: str, url: str, breaker: bool = False, **kwargs
+) -> requests.Response:
+    """
+    Send a request using the shared session.
+
+    Args:
+        method (str): The HTTP method
+        url (str): The URL
+        breaker (bool): Guard the call with the origin's circuit breaker. Only
+            for the site's own upstreams, never for user supplied URLs
+        **kwargs: Passed to requests, timeout defaults to HTTP_TIMEOUT
+
+    Returns:
+        requests.Response: The response
+
+    Raises:
+        CircuitOpenError: If the origin's circuit breaker is open
+        requests.RequestException: If the request fails
+    """
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+    host = urlparse(url).hostname or ""
+    origin = _get_origin(url) if breaker else None
+    if origin and not _allow_request(origin):
+        with _upstream_stats_lock:
+            stats = _upstream_stats.get(host)
+            if stats is not None:
+                stats["short_circuited"] += 1
+        raise CircuitOpenError(f"Circuit breaker open for {origin}")
+
+    start = time.perf_counter()
+    error = True
+    try:
+        response = get_session().request(method, url, **kwargs)
+        error = response.status_code >= HTTP_SERVER_ERROR
+    finally:
+        _record(host, time.perf_counter() - start, error)
+        if origin:
+            _record_result(origin, error)
+    return response
+
+
+def get(url: str, breaker: bool = False, **kwargs) -> requests.Response:
+    """Send a GET request using the shared session."""
+    return request("GET", url, breaker=breaker, **kwargs)
+
+
+def post(url: str, breaker: bool = False, **kwargs) -> requests.Response:
+    """Send a POST request using the shared session."""
+    return request("POST", url, breaker=breaker, **kwargs)
+
+
+def get_upstream_stats() -> dict:
+    """
+    Get the request metrics for each upstream host for this worker.
+
+    Returns:
+        dict: host -> requests, errors, error ratio, average latency and a
+            cumulative latency histogram (bucket upper bound -> count)
+    """
+    with _upstream_stats_lock:
+        snapshot = {
+            host: {**stats, "buckets": list(stats["buckets"])}
+            for host, stats in _upstream_stats.items()
+        }
+    with _breakers_lock:
+        origins = list(_breakers)
+    circuits = {urlparse(origin).hostname: origin for origin in origins}
+
+    result = {}
+    for host, stats in snapshot.items():
+        histogram = {}
+        count = 0
+        for bound, bucket in zip(
+            [*map(str, HTTP_LATENCY_BUCKETS), "+Inf"], stats["buckets"], strict=True
+        ):
+            count += bucket
+            histogram[bound] = count
+        result[host] = {
+            "requests": stats["requests"],
+            "errors": stats["errors"],
+            "error_ratio": round(stats["errors"] / stats["requests"], 4),
+            "avg_seconds": round(stats["seconds"] / stats["requests"], 4),
+            "latency": histogram,
+            "short_circuited": stats["short_circuited"],
+            "circuit": get_circuit_state(circuits[host]) if host in circuits else None,
+        }
+    return result
@@ -0,0 +1,345 @@
+"""
+Responsive image module for raster images under templates/assets.
+Serves resized WebP/AVIF variants based on the client's Accept header and a
+width hint, generating them on first request and caching them on disk.
+
+Run `python3 images.py --build` to generate every variant ahead of time.
+"""
+
+import os
+import re
+import threading
+from functools import lru_cache
+
+from flask import Request
+from jinja2.ext import Extension
+from PIL import Image, UnidentifiedImageError, features
+
+from assets import (
+    Asset,
+    asset_url,
+    find_asset,
+    get_asset_hash,
+    list_assets,
+    send_asset,
+)
+from singleflight import single_flight
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", ".cache/images")
+IMAGE_WIDTHS = (320, 640, 960, 1280, 1920)
+IMAGE_SOURCE_TYPES = ("image/png", "image/jpeg", "image/webp")
+
+# Output formats in order of preference (mimetype -> Pillow format, extension, quality)
+IMAGE_FORMATS = {
+    "image/avif": ("AVIF", ".avif", 60),
+    "image/webp": ("WEBP", ".webp", 80),
+}
+if not features.check("avif"):
+    IMAGE_FORMATS.pop("image/avif")
+
+# <img> tags in exported templates, e.g. <img src="/assets/img/profile.jpg">
+TEMPLATE_IMG_PATTERN = re.compile(r"<img\b[^>]*>")
+TEMPLATE_IMG_SRC_PATTERN = re.compile(
+    r'\bsrc="/assets/(?P<path>[^"{}]+\.(?:png|jpe?g|webp))"'
+)
+TEMPLATE_IMG_WIDTH_PATTERN = re.compile(r'\bwidth="(?P<width>\d+)(?:px)?"')
+TEMPLATE_IMG_SIZES_PATTERN = re.compile(r'\bsizes="[^"]+"')
+TEMPLATE_IMG_CLASS_PATTERN = re.compile(r'\bclass="(?P<classes>[^"]*)"')
+
+# Sizes hints for <img> classes sized by the stylesheets (class -> sizes)
+IMAGE_CLASS_SIZES = {
+    # Profile picture, see .profile in Social-Icons.css
+    "profile": "(max-width: 500px) 200px, 300px",
+}
+
+
+def is_image(asset: Asset) -> bool:
+    """
+    Check if an asset can have responsive variants.
+
+    Args:
+        asset (Asset): The asset
+
+    Returns:
+        bool: True for PNG, JPEG and WebP images
+    """
+    return asset.mimetype in IMAGE_SOURCE_TYPES
+
+
+@lru_cache(maxsize=512)
+def _get_image_width(full_path: str, mtime: float) -> int:
+    """
+    Read an image's width from its header. Keyed on mtime so edits are picked up.
+    """
+    try:
+        with Image.open(full_path) as image:
+            return image.size[0]
+    except (UnidentifiedImageError, OSError):
+        return 0
+
+
+def get_image_width(asset: Asset) -> int:
+    """
+    Get the width of an image asset in pixels.
+
+    Args:
+        asset (Asset): The image asset
+
+    Returns:
+        int: The width, or 0 if the image can't be read
+    """
+    return _get_image_width(asset.path, asset.mtime)
+
+
+def get_target_width(request: Request, asset: Asset) -> int | None:
+    """
+    Snap the requested ?w= width to the next size in IMAGE_WIDTHS.
+
+    Args:
+        request (Request): The Flask request object
+        asset (Asset): The image asset
+
+    Returns:
+        Optional[int]: The width to resize to, or None to keep the original size
+    """
+    width = request.args.get("w", type=int)
+    if not width or width <= 0:
+        return None
+
+    original_width = get_image_width(asset)
+    for size in IMAGE_WIDTHS:
+        if size >= width:
+            # Never upscale
+            return size if size < original_width else None
+    return None
+
+
+def choose_format(request: Request, asset: Asset) -> str | None:
+    """
+    Pick the best image format the client accepts.
+
+    Args:
+        request (Request): The Flask request object
+        asset (Asset): The image asset
+
+    Returns:
+        Optional[str]: The output mimetype, or None to keep the original format
+    """
+    for mimetype in IMAGE_FORMATS:
+        if mimetype == asset.mimetype:
+            break
+        # Only use explicitly listed types, not */* or image/*
+        if any(
+            value == mimetype and quality > 0
+            for value, quality in request.accept_mimetypes
+        ):
+            return mimetype
+    return None
+
+
+def _variant_path(asset: Asset, width: int | None, mimetype: str) -> str:
+    """
+    Get the cache path for an image variant.
+    Includes the content hash so edited images get new variants.
+    """
+    extension = IMAGE_FORMATS[mimetype][1]
+    name = asset.name.replace("/", "_")
+    size = width or "full"
+    return os.path.join(
+        IMAGE_CACHE_DIR, f"{name}.{get_asset_hash(asset)}.{size}{extension}"
+    )
+
+
+def get_image_variant(asset: Asset, width: int | None, mimetype: str) -> str | None:
+    """
+    Get the path of a resized/converted image, generating it if needed.
+
+    Args:
+        asset (Asset): The source image asset
+        width (Optional[int]): The target width, or None for the original size
+        mimetype (str): The output mimetype
+
+    Returns:
+        Optional[str]: The variant path, or None if it couldn't be generated
+    """
+    variant_path = _variant_path(asset, width, mimetype)
+    if os.path.isfile(variant_path):
+        return variant_path
+    return _generate_variant(variant_path, asset, width, mimetype)
+
+
+# Concurrent first requests for a variant share one encode
+@single_flight(key=lambda variant_path, *args: variant_path)
+def _generate_variant(
+    variant_path: str, asset: Asset, width: int | None, mimetype: str
+) -> str | None:
+    if os.path.isfile(variant_path):
+        return variant_path
+
+    image_format, _, quality = IMAGE_FORMATS[mimetype]
+    tmp_path = f"{variant_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        with Image.open(asset.path) as image:
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+            if width and width < image.size[0]:
+                height = round(image.size[1] * width / image.size[0])
+                image = image.resize((width, height), Image.Resampling.LANCZOS)
+            image.save(tmp_path, format=image_format, quality=quality)
+        os.replace(tmp_path, variant_path)
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        print(f"Warning: Failed to generate image variant for {asset.name}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    return variant_path
+
+
+def send_image(request: Request, asset: Asset, immutable: bool = False):
+    """
+    Send the best variant of an image for the client's Accept header and ?w= hint.
+
+    Args:
+        request (Request): The Flask request object
+        asset (Asset): The image asset
+        immutable (bool): Whether the URL is fingerprinted and can be cached forever
+
+    Returns:
+        Response: The file response
+    """
+    width = get_target_width(request, asset)
+    mimetype = choose_format(request, asset)
+    # Resize in the original format if there's no better one (WebP only)
+    if width and not mimetype and asset.mimetype in IMAGE_FORMATS:
+        mimetype = asset.mimetype
+
+    variant = asset
+    if mimetype:
+        variant_path = get_image_variant(asset, width, mimetype)
+        if variant_path:
+            stat = os.stat(variant_path)
+            # Only use a full-size conversion if it is actually smaller
+            if width or stat.st_size < asset.size:
+                variant = Asset(
+                    variant_path, asset.name, stat.st_size, stat.st_mtime, mimetype
+                )
+
+    response = send_asset(request, variant, immutable=immutable)
+    response.vary.add("Accept")
+    return response
+
+
+def image_srcset(path: str) -> str:
+    """
+    Build a srcset attribute value of resized variants for an image.
+
+    Args:
+        path (str): The asset path, with or without a leading /assets/
+
+    Returns:
+        str: The srcset value, or an empty string if the image doesn't exist
+    """
+    path = path.removeprefix("/").removeprefix("assets/")
+    asset = find_asset(path)
+    if asset is None or not is_image(asset):
+        return ""
+
+    original_width = get_image_width(asset)
+    if not original_width:
+        return ""
+
+    url = asset_url(path)
+    candidates = [f"{url}?w={w} {w}w" for w in IMAGE_WIDTHS if w < original_width]
+    candidates.append(f"{url} {original_width}w")
+    return ", ".join(candidates)
+
+
+def _get_sizes_hint(tag: str) -> str | None:
+    width = TEMPLATE_IMG_WIDTH_PATTERN.search(tag)
+    if width:
+        return f"{width.group('width')}px"
+    classes = TEMPLATE_IMG_CLASS_PATTERN.search(tag)
+    for name in classes.group("classes").split() if classes else []:
+        if name in IMAGE_CLASS_SIZES:
+            return IMAGE_CLASS_SIZES[name]
+    return None
+
+
+def add_srcset(source: str) -> str:
+    """
+    Add srcset/sizes attributes to asset <img> tags in a template source.
+    The sizes hint comes from the tag's sizes or width attribute, or its class
+    in IMAGE_CLASS_SIZES. Tags without one are left alone, as the browser
+    would assume the image fills the viewport and fetch the largest variant.
+
+    Args:
+        source (str): The template source
+
+    Returns:
+        str: The template source with srcset attributes added
+    """
+
+    def replace(match: re.Match) -> str:
+        tag = match.group(0)
+        src = TEMPLATE_IMG_SRC_PATTERN.search(tag)
+        if not src or "srcset=" in tag:
+            return tag
+        srcset = f'srcset="{{{{ image_srcset({src.group("path")!r}) }}}}" '
+        if TEMPLATE_IMG_SIZES_PATTERN.search(tag):
+            return f"{tag[: src.start()]}{srcset}{tag[src.start() :]}"
+
+        sizes = _get_sizes_hint(tag)
+        if sizes is None:
+            return tag
+        return f'{tag[: src.start()]}{srcset}sizes="{sizes}" {tag[src.start() :]}'
+
+    return TEMPLATE_IMG_PATTERN.sub(replace, source)
+
+
+class ImageSrcsetExtension(Extension):
+    """
+    Jinja extension that adds srcset attributes to <img> tags in HTML templates
+    so browsers can request resized variants.
+    """
+
+    # Run before AssetUrlExtension rewrites the src attributes
+    priority = 50
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.globals["image_srcset"] = image_srcset
+
+    def preprocess(self, source, name, filename=None):
+        if not name or not name.endswith(".html"):
+            return source
+        return add_srcset(source)
+
+
+def build_image_variants() -> int:
+    """
+    Generate every width/format variant for every image asset.
+
+    Returns:
+        int: Number of variants generated or already cached
+    """
+    count = 0
+    for asset in list_assets():
+        if not is_image(asset):
+            continue
+        original_width = get_image_width(asset)
+        widths = [None] + [w for w in IMAGE_WIDTHS if w < original_width]
+        for mimetype in IMAGE_FORMATS:
+            for width in widths:
+                if get_image_variant(asset, width, mimetype):
+                    count += 1
+    return count
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--build" in sys.argv or "-b" in sys.argv:
+        print(f"Building image variants ({', '.join(IMAGE_FORMATS)})...")
+        count = build_image_variants()
+        print(f"Built {count} image variants in {IMAGE_CACHE_DIR}.")
@@ -1,9 +1,13 @@
 import os
 
 from gunicorn.app.base import BaseApplication
+from jinja2 import TemplateError
 
 from server import app
 
+# Templates compiled before the workers start
+WARM_TEMPLATE_EXTENSIONS = ["html", "ascii", "finger"]
+
 
 class GunicornApp(BaseApplication):
     def __init__(self, app, options=None):
@@ -20,6 +24,27 @@ class GunicornApp(BaseApplication):
         return self.application
 
 
+def warm_templates() -> int:
+    """
+    Compile every template before the workers are forked.
+    Workers inherit the compiled templates and the bytecode cache is filled
+    for the next restart.
+
+    Returns:
+        int: Number of templates compiled
+    """
+    count = 0
+    for name in app.jinja_env.list_templates(extensions=WARM_TEMPLATE_EXTENSIONS):
+        if name.startswith("assets/"):
+            continue
+        try:
+            app.jinja_env.get_template(name)
+            count += 1
+        except TemplateError as e:
+            print(f"Warning: Failed to compile template {name}: {e}", flush=True)
+    return count
+
+
 if __name__ == "__main__":
     workers = os.getenv("WORKERS")
     threads = os.getenv("THREADS")
@@ -34,6 +59,7 @@ if __name__ == "__main__":
         "workers": workers,
         "threads": threads,
     }
+    print(f"Compiled {warm_templates()} templates", flush=True)
     gunicorn_app = GunicornApp(app, options)
     print(
         "Starting server with "
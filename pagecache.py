@@ -0,0 +1,98 @@
+"""
+Page cache module for rendered template pages.
+Stores the finished body and headers of pages that only depend on their
+template, the sites data and the host, so repeat hits skip Jinja entirely.
+Entries are validated against the page's ETag, which changes with the
+template and data mtimes, the asset version and the code version.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from flask import Response, make_response
+
+HTTP_OK = 200
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "256"))
+# Headers that are set per response and shouldn't be cached
+PAGE_CACHE_SKIP_HEADERS = ("Content-Length", "Date", "Set-Cookie")
+
+
+class CachedPage(NamedTuple):
+    """A rendered page."""
+
+    etag: str
+    status: int
+    headers: tuple[tuple[str, str], ...]
+    body: bytes
+
+
+# LRU page cache storage: (template, host, client class) -> CachedPage
+_page_cache: OrderedDict[tuple, CachedPage] = OrderedDict()
+_page_cache_stats = {"hits": 0, "misses": 0}
+_page_cache_lock = threading.Lock()
+
+
+def cached_response(key: tuple, etag: str, render) -> Response:
+    """
+    Get a rendered page from the cache, rendering and storing it on a miss.
+    Only 200 responses without cookies are cached.
+
+    Args:
+        key (tuple): The cache key, e.g. (template, host, client class)
+        etag (str): The current ETag of the page, used to validate the entry
+        render (Callable): Function returning the response to send
+
+    Returns:
+        Response: The cached or freshly rendered response
+    """
+    with _page_cache_lock:
+        page = _page_cache.get(key)
+        if page is not None and page.etag == etag:
+            _page_cache.move_to_end(key)
+            _page_cache_stats["hits"] += 1
+        else:
+            page = None
+            _page_cache_stats["misses"] += 1
+
+    if page is not None:
+        return Response(page.body, page.status, list(page.headers))
+
+    response = make_response(render())
+    if response.status_code != HTTP_OK or "Set-Cookie" in response.headers:
+        return response
+
+    headers = tuple(
+        (name, value)
+        for name, value in response.headers.items()
+        if name not in PAGE_CACHE_SKIP_HEADERS
+    )
+    page = CachedPage(etag, response.status_code, headers, response.get_data())
+    with _page_cache_lock:
+        _page_cache[key] = page
+        _page_cache.move_to_end(key)
+        while len(_page_cache) > PAGE_CACHE_SIZE:
+            _page_cache.popitem(last=False)
+    return response
+
+
+def get_page_cache_stats() -> dict:
+    """
+    Get the page cache hit/miss counters for this worker.
+
+    Returns:
+        dict: Hits, misses, hit ratio and number of cached pages
+    """
+    with _page_cache_lock:
+        hits = _page_cache_stats["hits"]
+        misses = _page_cache_stats["misses"]
+        entries = len(_page_cache)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+        "entries": entries,
+        "max_entries": PAGE_CACHE_SIZE,
+    }
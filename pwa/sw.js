@@ -1,26 +1,23 @@
 // This is the service worker with the combined offline experience (Offline page + Offline copy of pages)
 
 const CACHE = "pwabuilder-offline-page";
+const OFFLINE_PAGE = "/";
 
-importScripts('https://storage.googleapis.com/workbox-cdn/releases/5.1.2/workbox-sw.js');
-
-const PRECACHE_ASSETS = [
-  '/',
-  '/404',
-  '/assets/bootstrap/css/bootstrap.min.css',
-  'https://fonts.googleapis.com/css?family=Lora:400,700,400italic,700italic&display=swap',
-  'https://fonts.googleapis.com/css?family=Cabin:700&display=swap',
-  'https://fonts.googleapis.com/css?family=Anonymous+Pro&display=swap',
-  'https://fonts.googleapis.com/css?family=Roboto:300,400,500,700',
-  '/assets/css/styles.min.css',
-  '/assets/css/404.min.css',
-  '/assets/css/profile.min.css',
-  '/assets/bootstrap/js/bootstrap.min.js',
-  '/assets/js/script.min.js',
-  '/assets/js/404.min.js',
-  '/assets/img/favicon/favicon-16x16.png',
-  '/assets/img/favicon/android-chrome-192x192.png'
-]
+// Precache manifest of {url, revision} entries, generated from the asset index by the server
+const PRECACHE_MANIFEST = self.__PRECACHE_MANIFEST || [];
+
+// Cache key for each URL. Revisioned URLs get the revision in their key so
+// only entries that changed are fetched again.
+const PRECACHE_KEYS = new Map(
+  PRECACHE_MANIFEST.map((entry) => {
+    const url = new URL(entry.url, self.location);
+    const key = new URL(url);
+    if (entry.revision) {
+      key.searchParams.set("__revision", entry.revision);
+    }
+    return [url.href, key.href];
+  })
+);
 
 
 self.addEventListener("message", (event) => {
@@ -29,9 +26,61 @@ self.addEventListener("message", (event) => {
   }
 });
 
-self.addEventListener('install', async (event) => {
+self.addEventListener('install', (event) => {
+  event.waitUntil(
+    caches.open(CACHE).then((cache) =>
+      Promise.all(
+        Array.from(PRECACHE_KEYS, async ([url, key]) => {
+          if (await cache.match(key)) {
+            return;
+          }
+          const response = await fetch(url, { cache: "reload" });
+          if (!response.ok) {
+            throw new Error(`Failed to precache ${url}: ${response.status}`);
+          }
+          await cache.put(key, response);
+        })
+      )
+    )
+  );
+});
+
+self.addEventListener('activate', (event) => {
+  // Remove entries that are no longer in the manifest
+  const keys = new Set(PRECACHE_KEYS.values());
   event.waitUntil(
-    caches.open(CACHE)
-      .then((cache) => cache.addAll(PRECACHE_ASSETS))
+    caches.open(CACHE).then(async (cache) => {
+      const requests = await cache.keys();
+      await Promise.all(
+        requests
+          .filter((request) => !keys.has(request.url))
+          .map((request) => cache.delete(request))
+      );
+    })
   );
 });
+
+self.addEventListener('fetch', (event) => {
+  if (event.request.method !== "GET") {
+    return;
+  }
+  const url = new URL(event.request.url);
+  url.hash = "";
+  const key = PRECACHE_KEYS.get(url.href);
+
+  if (event.request.mode === "navigate") {
+    // Network first for pages, falling back to the precached copy when offline
+    event.respondWith(
+      fetch(event.request).catch(async () => {
+        const cache = await caches.open(CACHE);
+        const offlineKey = PRECACHE_KEYS.get(new URL(OFFLINE_PAGE, self.location).href);
+        return (key && (await cache.match(key))) || cache.match(offlineKey);
+      })
+    );
+  } else if (key) {
+    // Precached assets have content hashed URLs, so the cache is always current
+    event.respondWith(
+      caches.open(CACHE).then(async (cache) => (await cache.match(key)) || fetch(event.request))
+    );
+  }
+});
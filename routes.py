@@ -0,0 +1,195 @@
+"""
+Route table module for the catch all route.
+Maps every spelling of a page path (about, about.html, about/) to its
+template, and every filename in the template tree to its path, so lookups
+don't touch the filesystem. Directories are checked for changes at most once
+every ROUTE_RESCAN_INTERVAL seconds and only the ones that changed are rescanned.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+TEMPLATE_ROOT = "templates"
+ROUTE_RESCAN_INTERVAL = int(os.getenv("ROUTE_RESCAN_INTERVAL", "5"))
+# Directories under TEMPLATE_ROOT that are served by their own routes
+ROUTE_EXCLUDE_DIRS = ["assets"]
+
+
+class Directory(NamedTuple):
+    """A scanned template directory."""
+
+    mtime: float
+    files: tuple[str, ...]
+    subdirs: tuple[str, ...]
+
+
+# Route table storage
+_route_index = {"dirs": {}, "routes": {}, "filenames": {}, "timestamp": 0.0}
+_route_lock = threading.Lock()
+
+
+def _scan_directory(path: str, dirs: dict[str, Directory]):
+    """
+    List a directory and its subdirectories into dirs.
+    Missing directories are skipped.
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+        entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+    except OSError:
+        return
+    files = tuple(entry.name for entry in entries if entry.is_file())
+    subdirs = tuple(entry.path for entry in entries if entry.is_dir())
+    dirs[path] = Directory(mtime, files, subdirs)
+    for subdir in subdirs:
+        _scan_directory(subdir, dirs)
+
+
+def _update_dirs(dirs: dict[str, Directory]) -> dict[str, Directory] | None:
+    """
+    Rescan the directories whose mtime changed.
+    Adding, removing or renaming a file changes its directory's mtime.
+
+    Returns:
+        Optional[dict]: The updated directories, or None if nothing changed
+    """
+    changed = []
+    for path, directory in dirs.items():
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != directory.mtime:
+            changed.append(path)
+    if not changed:
+        return None
+
+    dirs = dict(dirs)
+    for path in changed:
+        if path not in dirs:
+            # Already rescanned as part of a changed parent
+            continue
+        prefix = path + os.sep
+        for subdir in [d for d in dirs if d == path or d.startswith(prefix)]:
+            del dirs[subdir]
+        _scan_directory(path, dirs)
+    return dirs
+
+
+def _walk(dirs: dict[str, Directory]):
+    """
+    Yield (path, Directory) pairs breadth first, so shallower files win
+    filename lookups (img/favicon/favicon.png over img/external/HNS/black/favicon.png).
+    """
+    queue = deque([TEMPLATE_ROOT])
+    while queue:
+        path = queue.popleft()
+        directory = dirs.get(path)
+        if directory is None:
+            continue
+        yield path, directory
+        queue.extend(directory.subdirs)
+
+
+def _build_tables(dirs: dict[str, Directory]) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    Build the route and filename tables from the scanned directories.
+
+    Returns:
+        Tuple[dict, dict]: Request path -> template name, and filename -> file path
+    """
+    excluded = [os.path.join(TEMPLATE_ROOT, d) for d in ROUTE_EXCLUDE_DIRS]
+    pages = []
+    filenames = {}
+    for path, directory in _walk(dirs):
+        is_page_dir = not any(
+            path == d or path.startswith(d + os.sep) for d in excluded
+        )
+        for filename in directory.files:
+            full_path = os.path.join(path, filename)
+            # The shallowest match wins
+            filenames.setdefault(filename, full_path)
+            if is_page_dir:
+                name = os.path.relpath(full_path, TEMPLATE_ROOT)
+                pages.append(name.replace(os.sep, "/"))
+
+    # Real filenames take priority over .html-less spellings
+    routes = {name: name for name in pages}
+    for name in pages:
+        if name.endswith(".html"):
+            routes.setdefault(name.removesuffix(".html"), name)
+    return routes, filenames
+
+
+def refresh_route_index(force: bool = False) -> bool:
+    """
+    Update the route table if a template directory has changed.
+    Checks at most once every ROUTE_RESCAN_INTERVAL seconds unless forced.
+
+    Args:
+        force (bool): Check regardless of the interval and rescan everything
+
+    Returns:
+        bool: True if the table was rebuilt
+    """
+    global _route_index
+    current_time = time.time()
+    if not force and current_time - _route_index["timestamp"] < ROUTE_RESCAN_INTERVAL:
+        return False
+
+    # Only one thread needs to rescan, others keep using the current table
+    if not _route_lock.acquire(blocking=force):
+        return False
+    try:
+        if force or not _route_index["dirs"]:
+            dirs = {}
+            _scan_directory(TEMPLATE_ROOT, dirs)
+        else:
+            dirs = _update_dirs(_route_index["dirs"])
+            if dirs is None:
+                _route_index["timestamp"] = current_time
+                return False
+
+        routes, filenames = _build_tables(dirs)
+        _route_index = {
+            "dirs": dirs,
+            "routes": routes,
+            "filenames": filenames,
+            "timestamp": current_time,
+        }
+        return True
+    finally:
+        _route_lock.release()
+
+
+def resolve_route(path: str) -> str | None:
+    """
+    Resolve a request path to a template.
+    Tries the path as is, with .html added and with slashes stripped.
+
+    Args:
+        path (str): The request path without the leading /
+
+    Returns:
+        Optional[str]: The template name or None if there's no matching page
+    """
+    refresh_route_index()
+    routes = _route_index["routes"]
+    return routes.get(path) or routes.get(path.strip("/") + ".html")
+
+
+def find_template_file(filename: str) -> str | None:
+    """
+    Find a file anywhere in the template tree by its filename.
+
+    Args:
+        filename (str): The filename to find
+
+    Returns:
+        Optional[str]: The path to the shallowest match, or None if not found
+    """
+    refresh_route_index()
+    return _route_index["filenames"].get(filename)
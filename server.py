@@ -1,12 +1,17 @@
 import argparse
 import datetime
+import hashlib
+import inspect
+import io
 import json
 import os
+import shutil
+from contextlib import suppress
+from pathlib import Path
 from zoneinfo import ZoneInfo
 
 import dotenv
 import qrcode
-import requests
 from ansi2html import Ansi2HTMLConverter
 from flask import (
     Flask,
@@ -16,13 +21,23 @@ from flask import (
     render_template,
     request,
     send_file,
-    send_from_directory,
 )
 from flask_cors import CORS
+from jinja2 import FileSystemBytecodeCache
 from PIL import Image
 from qrcode.constants import ERROR_CORRECT_H, ERROR_CORRECT_L
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+import http_client
+from assets import (
+    AssetUrlExtension,
+    deliver_file,
+    find_asset,
+    find_fingerprinted_asset,
+    refresh_asset_index,
+    send_asset,
+)
+
 # Import blueprints
 from blueprints import acme, api, blog, now, podcast, spotify, wellknown
 from cache_helper import (
@@ -33,14 +48,22 @@ from cache_helper import (
     get_wallet_tokens,
 )
 from curl import curl_response, finger_response
+from fragments import FragmentCacheExtension
+from images import ImageSrcsetExtension, is_image, send_image
+from routes import find_template_file, refresh_route_index, resolve_route
+from serviceworker import get_service_worker
+from sitemap import get_sitemap
+from snapshot import load_snapshot, start_snapshot_timer
 from tools import (
+    SITES_FILE,
+    conditional_response,
     error_response,
     get_resume_data,
     get_resume_pdf,
+    get_sites,
     get_tools_data,
     getAddress,
     getClientIP,
-    getFilePath,
     getHandshakeScript,
     isCLI,
     isFinger,
@@ -50,6 +73,9 @@ from tools import (
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 CORS(app)
+app.jinja_env.add_extension(AssetUrlExtension)
+app.jinja_env.add_extension(ImageSrcsetExtension)
+app.jinja_env.add_extension(FragmentCacheExtension)
 
 # Register blueprints
 for module in [now, blog, wellknown, api, podcast, acme, spotify]:
@@ -60,6 +86,36 @@ dotenv.load_dotenv()
 
 # region Config/Constants
 
+# Compiled templates are shared between workers and kept across restarts
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", ".cache/jinja")
+# Jinja only keys compiled templates on their source, not on what the
+# extensions' preprocessors do to it, so they're stored per extension version
+JINJA_CACHE_VERSION = hashlib.sha256(
+    b"".join(
+        Path(inspect.getfile(extension)).read_bytes()
+        for extension in (
+            AssetUrlExtension,
+            ImageSrcsetExtension,
+            FragmentCacheExtension,
+        )
+    )
+).hexdigest()[:12]
+try:
+    jinja_cache_path = os.path.join(JINJA_CACHE_DIR, JINJA_CACHE_VERSION)
+    os.makedirs(jinja_cache_path, exist_ok=True)
+    # Remove templates compiled by older versions
+    for entry in os.scandir(JINJA_CACHE_DIR):
+        if entry.name == JINJA_CACHE_VERSION:
+            continue
+        if entry.is_dir():
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            with suppress(OSError):
+                os.remove(entry.path)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(jinja_cache_path)
+except OSError as e:
+    print(f"Warning: Jinja bytecode cache disabled: {e}")
+
 # Rate limiting for hosting enquiries
 EMAIL_REQUEST_COUNT = {}  # Track requests by email
 IP_REQUEST_COUNT = {}  # Track requests by IP
@@ -76,15 +132,16 @@ REDIRECT_ROUTES = {
 }
 DOWNLOAD_ROUTES = {"pgp": "data/nathanwoodburn.asc"}
 
-SITES = []
-if os.path.isfile("data/sites.json"):
-    with open("data/sites.json") as file:
-        SITES = json.load(file)
-        # Remove any sites that are not enabled
-        SITES = [site for site in SITES if "enabled" not in site or site["enabled"]]
-
 TZ = ZoneInfo(os.getenv("TIMEZONE", "Australia/Sydney"))
 
+# Build the asset index and route table before serving any requests
+refresh_asset_index(force=True)
+refresh_route_index(force=True)
+# Serve the caches from the last run while they refresh
+load_snapshot()
+# Each worker saves its caches on a timer and at shutdown
+app.before_request(start_snapshot_timer)
+
 # endregion
 
 # region Assets routes
@@ -92,71 +149,48 @@ TZ = ZoneInfo(os.getenv("TIMEZONE", "Australia/Sydney"))
 
 @app.route("/assets/<path:path>")
 def asset(path):
-    if path.endswith(".json"):
-        return send_from_directory(
-            "templates/assets", path, mimetype="application/json"
-        )
-
-    if os.path.isfile("templates/assets/" + path):
-        return send_from_directory("templates/assets", path)
-
-    # Custom matching for images
-    pathMap = {
-        "img/hns/w": "img/external/HNS/white",
-        "img/hns/b": "img/external/HNS/black",
-        "img/hns": "img/external/HNS/black",
-    }
-
-    for key, value in pathMap:
-        if path.startswith(key):
-            tmpPath = path.replace(key, value)
-            if os.path.isfile("templates/assets/" + tmpPath):
-                return send_from_directory("templates/assets", tmpPath)
-
-    # Try looking in one of the directories
-    filename: str = path.split("/")[-1]
-    if filename.endswith((".png", ".jpg", ".jpeg", ".svg")):
-        if os.path.isfile("templates/assets/img/" + filename):
-            return send_from_directory("templates/assets/img", filename)
-        if os.path.isfile("templates/assets/img/favicon/" + filename):
-            return send_from_directory("templates/assets/img/favicon", filename)
-
-    return error_response(request)
+    asset, immutable = find_fingerprinted_asset(path)
+    if asset is None:
+        return error_response(request)
+    if is_image(asset):
+        return send_image(request, asset, immutable=immutable)
+    return send_asset(request, asset, immutable=immutable)
 
 
 @app.route("/fonts/<path:path>")
 def fonts(path):
-    if os.path.isfile("templates/assets/fonts/" + path):
-        return send_from_directory("templates/assets/fonts", path)
-    return error_response(request)
+    asset, immutable = find_fingerprinted_asset("fonts/" + path)
+    if asset is None:
+        return error_response(request)
+    return send_asset(request, asset, immutable=immutable)
 
 
 @app.route("/sitemap")
 @app.route("/sitemap.xml")
 def sitemap():
-    # Remove all .html from sitemap
-    if not os.path.isfile("templates/sitemap.xml"):
-        return error_response(request)
-    with open("templates/sitemap.xml") as file:
-        sitemap = file.read()
-
-    sitemap = sitemap.replace(".html", "")
-    return make_response(sitemap, 200, {"Content-Type": "application/xml"})
+    data, etag = get_sitemap()
+    response = make_response(data, 200, {"Content-Type": "application/xml"})
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 
 @app.route("/favicon.<ext>")
 def favicon(ext):
     if ext not in ("png", "svg", "ico"):
         return error_response(request)
-    return send_from_directory("templates/assets/img/favicon", f"favicon.{ext}")
+    asset = find_asset(f"img/favicon/favicon.{ext}")
+    if asset is None:
+        return error_response(request)
+    return send_asset(request, asset)
 
 
 @app.route("/<name>.js")
 def javascript(name):
     # Check if file in js directory
-    if not os.path.isfile("templates/assets/js/" + request.path.split("/")[-1]):
+    asset = find_asset("js/" + request.path.split("/")[-1])
+    if asset is None:
         return error_response(request)
-    return send_from_directory("templates/assets/js", request.path.split("/")[-1])
+    return send_asset(request, asset)
 
 
 @app.route("/download/<path:path>")
@@ -166,7 +200,7 @@ def download(path):
     # Check if file exists
     path = DOWNLOAD_ROUTES[path]
     if os.path.isfile(path):
-        return send_file(path)
+        return deliver_file(request, path)
 
     return error_response(request, message="File not found")
 
@@ -193,7 +227,12 @@ def manifest():
 
 @app.route("/sw.js")
 def serviceWorker():
-    return send_from_directory("pwa", "sw.js")
+    data, etag = get_service_worker()
+    response = make_response(data, 200, {"Content-Type": "application/javascript"})
+    response.set_etag(etag)
+    # Browsers should always revalidate so they see new precache revisions
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 
 # endregion
@@ -286,7 +325,7 @@ def index():
         ETH=ETHaddress,
         repo=repo,
         repo_description=repo_description,
-        sites=SITES,
+        sites=get_sites(),
         projects=projects,
         time=time,
         message="",
@@ -428,12 +467,13 @@ def qraddress(address):
     qr.make(fit=True)
     qr_image = qr.make_image(fill_color="#110033", back_color="white")
 
-    # Save the QR code image to a temporary file
-    qr_image_path = "/tmp/qr_code.png"
-    qr_image.save(qr_image_path)  # type: ignore
+    # Render in memory so concurrent requests don't share a temporary file
+    buffer = io.BytesIO()
+    qr_image.save(buffer)  # type: ignore
+    buffer.seek(0)
 
     # Return the QR code image as a response
-    return send_file(qr_image_path, mimetype="image/png")
+    return send_file(buffer, mimetype="image/png")
 
 
 @app.route("/qrcode/<path:data>")
@@ -459,8 +499,10 @@ def qrcodee(data):
     )
     qr_image.paste(logo, pos, mask=logo)
 
-    qr_image.save("/tmp/qr_code.png")
-    return send_file("/tmp/qr_code.png", mimetype="image/png")
+    buffer = io.BytesIO()
+    qr_image.save(buffer, format="PNG")
+    buffer.seek(0)
+    return send_file(buffer, mimetype="image/png")
 
 
 # endregion
@@ -580,7 +622,7 @@ def hosting_post():
     headers = {
         "Content-Type": "application/json",
     }
-    response = requests.post(webhook_url, json=data, headers=headers)
+    response = http_client.post(webhook_url, json=data, headers=headers)
     if response.status_code != 204 and response.status_code != 200:
         return json_response(request, "Failed to send enquiry", 500)
     return json_response(request, "Enquiry sent", 200)
@@ -590,8 +632,14 @@ def hosting_post():
 def resume():
     # Check if arg for support is passed
     support = bool(request.args.get("support"))
-    resume_data = get_resume_data(support=support)
-    return render_template("resume.html", resume=resume_data, support=support)
+    return conditional_response(
+        request,
+        ["templates/resume.html", "data/resume.json"],
+        lambda: render_template(
+            "resume.html", resume=get_resume_data(support=support), support=support
+        ),
+        support,
+    )
 
 
 @app.route("/resume.pdf")
@@ -600,7 +648,7 @@ def resume_pdf():
     support = bool(request.args.get("support"))
     force = bool(request.args.get("force") or request.args.get("rebuild"))
     pdf_path = get_resume_pdf(support=support, force=force)
-    return send_file(pdf_path, mimetype="application/pdf")
+    return deliver_file(request, pdf_path, mimetype="application/pdf")
 
 
 @app.route("/tools")
@@ -614,6 +662,21 @@ def tools():
 # region Error Catching
 
 
+def render_page(template: str):
+    """Render a template that only depends on the host and sites data."""
+    return conditional_response(
+        request,
+        ["templates/" + template, SITES_FILE],
+        lambda: render_template(
+            template,
+            handshake_scripts=getHandshakeScript(request.host),
+            sites=get_sites(),
+        ),
+        request.host,
+        cache_key=(template, request.host),
+    )
+
+
 # Catch all for GET requests
 @app.route("/<path:path>")
 def catch_all(path: str):
@@ -627,33 +690,16 @@ def catch_all(path: str):
     if path in REDIRECT_ROUTES:
         return redirect(REDIRECT_ROUTES[path], code=302)
 
-    # If file exists, load it
-    if os.path.isfile("templates/" + path):
-        return render_template(
-            path, handshake_scripts=getHandshakeScript(request.host), sites=SITES
-        )
-
-    # Try with .html
-    if os.path.isfile("templates/" + path + ".html"):
-        return render_template(
-            path + ".html",
-            handshake_scripts=getHandshakeScript(request.host),
-            sites=SITES,
-        )
-
-    if os.path.isfile("templates/" + path.strip("/") + ".html"):
-        return render_template(
-            path.strip("/") + ".html",
-            handshake_scripts=getHandshakeScript(request.host),
-            sites=SITES,
-        )
+    # If a template matches (with or without .html), load it
+    template = resolve_route(path)
+    if template:
+        return render_page(template)
 
     # Try to find a file matching
     if path.count("/") < 1:
-        # Try to find a file matching
-        filename = getFilePath(path, "templates")
+        filename = find_template_file(path)
         if filename:
-            return send_file(filename)
+            return deliver_file(request, filename)
 
     return error_response(request)
 
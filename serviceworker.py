@@ -0,0 +1,125 @@
+"""
+Service worker module.
+Generates /sw.js from pwa/sw.js with a precache manifest built from the asset
+index, so every precached URL carries a content hash and clients only
+re-fetch files that changed. The generated script is kept in memory and only
+rebuilt when the assets, the precached pages or pwa/sw.js change.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from assets import asset_url, find_asset, get_asset_version
+from tools import get_mtime
+
+SERVICE_WORKER_SOURCE = "pwa/sw.js"
+# Placeholder in SERVICE_WORKER_SOURCE replaced with the manifest
+SERVICE_WORKER_MANIFEST_MARKER = "self.__PRECACHE_MANIFEST"
+
+# Pages to precache (URL -> template)
+PRECACHE_PAGES = {
+    "/": "templates/index.html",
+    "/404": "templates/404.html",
+}
+# Asset paths to precache, served from their fingerprinted URLs
+PRECACHE_ASSETS = [
+    "bootstrap/css/bootstrap.min.css",
+    "css/styles.min.css",
+    "css/404.min.css",
+    "css/profile.min.css",
+    "bootstrap/js/bootstrap.min.js",
+    "js/script.min.js",
+    "js/404.min.js",
+    "img/favicon/favicon-16x16.png",
+    "img/favicon/android-chrome-192x192.png",
+]
+# External URLs to precache (never revisioned)
+PRECACHE_URLS = [
+    "https://fonts.googleapis.com/css?family=Lora:400,700,400italic,700italic&display=swap",
+    "https://fonts.googleapis.com/css?family=Cabin:700&display=swap",
+    "https://fonts.googleapis.com/css?family=Anonymous+Pro&display=swap",
+    "https://fonts.googleapis.com/css?family=Roboto:300,400,500,700",
+]
+
+# Cache storage for the generated service worker
+_service_worker_cache = {"data": None, "etag": "", "signature": None}
+_service_worker_lock = threading.Lock()
+
+
+def _get_page_revision(template: str) -> str:
+    """
+    Get a revision for a precached page.
+    Pages link to fingerprinted assets, so they change with the asset version.
+    """
+    digest = hashlib.sha256(get_asset_version().encode())
+    if os.path.isfile(template):
+        with open(template, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def build_precache_manifest() -> list[dict]:
+    """
+    Build the list of URLs for the service worker to precache.
+
+    Returns:
+        list: {"url", "revision"} entries. Revision is None for URLs that
+            already contain a content hash or are external.
+    """
+    manifest = [
+        {"url": url, "revision": _get_page_revision(template)}
+        for url, template in PRECACHE_PAGES.items()
+    ]
+    for path in PRECACHE_ASSETS:
+        asset = find_asset(path)
+        if asset is None:
+            print(f"Warning: Service worker precache asset not found: {path}")
+            continue
+        manifest.append({"url": asset_url(path), "revision": None})
+    manifest += [{"url": url, "revision": None} for url in PRECACHE_URLS]
+    return manifest
+
+
+def build_service_worker() -> bytes:
+    """
+    Build the service worker script with its precache manifest.
+
+    Returns:
+        bytes: The generated script
+    """
+    with open(SERVICE_WORKER_SOURCE, encoding="utf-8") as f:
+        source = f.read()
+    manifest = json.dumps(build_precache_manifest(), indent=2)
+    return source.replace(SERVICE_WORKER_MANIFEST_MARKER, manifest, 1).encode("utf-8")
+
+
+def get_service_worker() -> tuple[bytes, str]:
+    """
+    Get the service worker script, regenerating it if any of its inputs changed.
+
+    Returns:
+        Tuple[bytes, str]: The generated script and its ETag
+    """
+    global _service_worker_cache
+    signature = (
+        get_asset_version(),
+        get_mtime(SERVICE_WORKER_SOURCE),
+        *(get_mtime(template) for template in PRECACHE_PAGES.values()),
+    )
+    if (
+        _service_worker_cache["data"] is not None
+        and _service_worker_cache["signature"] == signature
+    ):
+        return _service_worker_cache["data"], _service_worker_cache["etag"]
+
+    with _service_worker_lock:
+        if _service_worker_cache["signature"] != signature:
+            data = build_service_worker()
+            _service_worker_cache = {
+                "data": data,
+                "etag": hashlib.sha256(data).hexdigest()[:32],
+                "signature": signature,
+            }
+    return _service_worker_cache["data"], _service_worker_cache["etag"]
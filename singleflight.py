@@ -0,0 +1,96 @@
+"""
+Single-flight module for coalescing concurrent calls.
+When several threads ask for the same key at once, only the first runs the
+function and the rest wait for and share its result (or exception):
+
+    @single_flight()
+    def fetch(name): ...
+
+The key defaults to the call's arguments. Results are shared between
+callers, so copy them before changing them.
+"""
+
+import threading
+from concurrent.futures import Future
+from functools import wraps
+from typing import Any
+
+
+class SingleFlight:
+    """Tracks the in-flight call for each key."""
+
+    def __init__(self):
+        self._calls: dict[Any, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Call a function, or wait for the call already running for the key.
+
+        Args:
+            key (Hashable): Calls with the same key are coalesced
+            function (Callable): The function to call
+            *args: Passed to the function
+            **kwargs: Passed to the function
+
+        Returns:
+            Any: The function's result
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        """
+        Get the number of keys with a call running.
+
+        Returns:
+            int: Number of in-flight calls
+        """
+        with self._lock:
+            return len(self._calls)
+
+
+def single_flight(key=None):
+    """
+    Decorator coalescing concurrent calls to a function.
+
+    Args:
+        key (Optional[Callable]): Function mapping the call's arguments to a key,
+            defaults to the arguments themselves
+
+    Returns:
+        Callable: The decorator
+    """
+
+    def decorator(function):
+        group = SingleFlight()
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            call_key = (
+                key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            )
+            return group.do(call_key, function, *args, **kwargs)
+
+        wrapper.group = group
+        return wrapper
+
+    return decorator
@@ -0,0 +1,120 @@
+"""
+Sitemap module.
+Generates sitemap.xml from the templates, now pages and blog posts, with
+lastmod taken from file mtimes. The serialized sitemap is kept in memory and
+only regenerated when one of the source directories changes.
+"""
+
+import datetime
+import hashlib
+import os
+import threading
+from xml.sax.saxutils import escape
+
+from blueprints import blog, now
+from tools import get_mtime
+
+SITE_URL = os.getenv("SITE_URL", "https://nathan.woodburn.au")
+# Directories whose mtimes change when a page is added or removed
+SITEMAP_SOURCE_DIRS = ["templates", "templates/now", "data/blog"]
+# Top level templates that aren't standalone pages
+SITEMAP_EXCLUDE = ["403", "404", "ascii", "index", "now", "podcast"]
+
+# Cache storage for the sitemap
+_sitemap_cache = {"data": None, "etag": "", "signature": None}
+_sitemap_lock = threading.Lock()
+
+
+def _format_lastmod(mtime: float) -> str:
+    return datetime.datetime.fromtimestamp(mtime, tz=datetime.UTC).strftime(
+        "%Y-%m-%dT%H:%M:%S+00:00"
+    )
+
+
+def list_template_pages() -> list[str]:
+    """
+    Get the names of top level template pages.
+
+    Returns:
+        list: Template names without the .html extension
+    """
+    pages = [
+        file.removesuffix(".html")
+        for file in os.listdir("templates")
+        if file.endswith(".html")
+    ]
+    return sorted(page for page in pages if page not in SITEMAP_EXCLUDE)
+
+
+def list_sitemap_entries() -> list[tuple[str, float]]:
+    """
+    Get every page to list in the sitemap.
+
+    Returns:
+        list: (path, mtime) tuples
+    """
+    now_pages = now.list_page_files()
+    blog_pages = blog.list_page_files()
+
+    entries = [
+        ("/", get_mtime("templates/index.html")),
+        ("/now", get_mtime(f"templates/now/{now_pages[0]}") if now_pages else 0.0),
+        ("/now/old", get_mtime("templates/now/old.html")),
+        ("/blog", get_mtime("templates/blog/blog.html")),
+    ]
+    entries += [
+        (f"/{page}", get_mtime(f"templates/{page}.html"))
+        for page in list_template_pages()
+    ]
+    entries += [
+        (f"/now/{page.removesuffix('.html')}", get_mtime(f"templates/now/{page}"))
+        for page in now_pages
+    ]
+    entries += [
+        (f"/blog/{page}", get_mtime(f"data/blog/{page}.md")) for page in blog_pages
+    ]
+    return entries
+
+
+def build_sitemap() -> bytes:
+    """
+    Build the sitemap XML.
+
+    Returns:
+        bytes: The serialized sitemap
+    """
+    xml = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+    ]
+    for path, mtime in list_sitemap_entries():
+        xml.append("    <url>")
+        xml.append(f"        <loc>{escape(SITE_URL + path)}</loc>")
+        if mtime:
+            xml.append(f"        <lastmod>{_format_lastmod(mtime)}</lastmod>")
+        xml.append("    </url>")
+    xml.append("</urlset>")
+    return ("\n".join(xml) + "\n").encode("utf-8")
+
+
+def get_sitemap() -> tuple[bytes, str]:
+    """
+    Get the sitemap, regenerating it if a source directory changed.
+
+    Returns:
+        Tuple[bytes, str]: The serialized sitemap and its ETag
+    """
+    global _sitemap_cache
+    signature = tuple(get_mtime(directory) for directory in SITEMAP_SOURCE_DIRS)
+    if _sitemap_cache["data"] is not None and _sitemap_cache["signature"] == signature:
+        return _sitemap_cache["data"], _sitemap_cache["etag"]
+
+    with _sitemap_lock:
+        if _sitemap_cache["signature"] != signature:
+            data = build_sitemap()
+            _sitemap_cache = {
+                "data": data,
+                "etag": hashlib.sha256(data).hexdigest()[:32],
+                "signature": signature,
+            }
+    return _sitemap_cache["data"], _sitemap_cache["etag"]
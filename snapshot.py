@@ -0,0 +1,130 @@
+"""
+Snapshot module for keeping warm caches across restarts.
+Caches register functions to dump and load their contents (with the time
+they were fetched). Every worker writes them to SNAPSHOT_FILE every
+SNAPSHOT_INTERVAL seconds and when it shuts down, and the server loads the
+file at startup before the workers are forked. Loaded entries are served
+straight away and refreshed in the background if they're stale.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", ".cache/snapshot.json")
+SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", "300"))
+# Snapshots older than this are ignored
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", str(7 * 86400)))
+# Bump when a cache's dump format changes
+SNAPSHOT_VERSION = 1
+
+# Cache name -> (dump function, load function)
+_snapshot_sources = {}
+_snapshot_state = {"pid": None, "saved": None}
+_snapshot_lock = threading.Lock()
+
+
+def register_snapshot(name: str, dump, load):
+    """
+    Register a cache to include in snapshots.
+
+    Args:
+        name (str): The cache name
+        dump (Callable): Function returning a new object with the cache contents
+            as JSON data, or None to leave it out
+        load (Callable): Function taking the contents from a snapshot
+    """
+    _snapshot_sources[name] = (dump, load)
+
+
+def save_snapshot() -> bool:
+    """
+    Write every registered cache to the snapshot file.
+    The file is replaced atomically and only written if the contents changed.
+
+    Returns:
+        bool: True if the file was written
+    """
+    caches = {name: dump() for name, (dump, _) in _snapshot_sources.items()}
+    with _snapshot_lock:
+        if caches == _snapshot_state["saved"]:
+            return False
+        directory = os.path.dirname(SNAPSHOT_FILE)
+        temp_file = f"{SNAPSHOT_FILE}.{os.getpid()}.tmp"
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(temp_file, "w") as f:
+                json.dump(
+                    {
+                        "version": SNAPSHOT_VERSION,
+                        "timestamp": time.time(),
+                        "caches": caches,
+                    },
+                    f,
+                )
+            os.replace(temp_file, SNAPSHOT_FILE)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Warning: Failed to save cache snapshot: {e}", flush=True)
+            return False
+        _snapshot_state["saved"] = caches
+    return True
+
+
+def load_snapshot() -> int:
+    """
+    Load the registered caches from the snapshot file.
+
+    Returns:
+        int: Number of caches loaded
+    """
+    try:
+        with open(SNAPSHOT_FILE) as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to read cache snapshot: {e}", flush=True)
+        return 0
+
+    if (
+        snapshot.get("version") != SNAPSHOT_VERSION
+        or time.time() - snapshot.get("timestamp", 0) > SNAPSHOT_MAX_AGE
+    ):
+        return 0
+
+    count = 0
+    for name, data in snapshot.get("caches", {}).items():
+        source = _snapshot_sources.get(name)
+        if source is None or data is None:
+            continue
+        try:
+            source[1](data)
+            count += 1
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Warning: Failed to load {name} from snapshot: {e}", flush=True)
+    return count
+
+
+def _snapshot_loop():
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL)
+        save_snapshot()
+
+
+def start_snapshot_timer():
+    """
+    Start saving snapshots on a timer and at shutdown.
+    Threads don't survive a fork, so each worker process starts its own.
+    """
+    pid = os.getpid()
+    if _snapshot_state["pid"] == pid:
+        return
+    with _snapshot_lock:
+        if _snapshot_state["pid"] == pid:
+            return
+        _snapshot_state["pid"] = pid
+        threading.Thread(target=_snapshot_loop, name="snapshot", daemon=True).start()
+        atexit.register(save_snapshot)
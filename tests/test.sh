@@ -1,3 +1,4 @@
 #!/bin/bash
 
 hurl --test *.hurl
+python3 -m unittest discover
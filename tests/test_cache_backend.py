@@ -0,0 +1,205 @@
+"""
+Tests for the cache backends, with the Redis backend run against a local fake
+server that speaks enough of RESP for it.
+
+Run from the repository root with `python3 -m unittest discover -s tests`.
+"""
+
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache_backend
+from cache_backend import (
+    CacheBackendError,
+    MemoryBackend,
+    RedisBackend,
+    SQLiteBackend,
+)
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Handles GET, SET (with NX and PX), DEL, AUTH and SELECT."""
+
+    def read_command(self) -> list[str] | None:
+        line = self.rfile.readline()
+        if not line.startswith(b"*"):
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode("utf-8"))
+        return args
+
+    def reply(self, value):
+        if value is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(value, int):
+            self.wfile.write(b":%d\r\n" % value)
+        elif isinstance(value, Exception):
+            self.wfile.write(f"-ERR {value}\r\n".encode())
+        elif value == "OK":
+            self.wfile.write(b"+OK\r\n")
+        else:
+            data = value.encode("utf-8")
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(data), data))
+
+    def handle(self):
+        server = self.server
+        authenticated = server.password is None
+        while (args := self.read_command()) is not None:
+            command = args[0].upper()
+            if command == "AUTH":
+                authenticated = args[-1] == server.password
+                self.reply("OK" if authenticated else Exception("invalid password"))
+            elif not authenticated:
+                self.reply(Exception("NOAUTH Authentication required"))
+            elif command == "SELECT":
+                self.reply("OK")
+            elif command == "GET":
+                self.reply(server.get(args[1]))
+            elif command == "SET":
+                self.reply(server.set(args[1], args[2], args[3:]))
+            elif command == "DEL":
+                self.reply(int(server.data.pop(args[1], None) is not None))
+            else:
+                self.reply(Exception(f"unknown command '{command}'"))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password: str | None = None):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.password = password
+        # key -> (value, expires)
+        self.data: dict[str, tuple[str, float | None]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            entry = self.data.get(key)
+            if entry and entry[1] is not None and entry[1] <= time.time():
+                del self.data[key]
+                return None
+            return entry[0] if entry else None
+
+    def set(self, key: str, value: str, options: list[str]) -> str | None:
+        options = [option.upper() for option in options]
+        expires = None
+        if "PX" in options:
+            expires = time.time() + int(options[options.index("PX") + 1]) / 1000
+        if "NX" in options and self.get(key) is not None:
+            return None
+        with self.lock:
+            self.data[key] = (value, expires)
+        return "OK"
+
+
+class BackendTests:
+    """Behaviour every backend shares."""
+
+    def create_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.backend = self.create_backend()
+
+    def test_get_missing(self):
+        self.assertIsNone(self.backend.get("missing"))
+
+    def test_set_and_get(self):
+        self.backend.set("key", {"a": [1, 2]}, 123.5)
+        self.assertEqual(self.backend.get("key"), ({"a": [1, 2]}, 123.5))
+
+    def test_add_only_once(self):
+        self.assertTrue(self.backend.add("lease", 1, 60))
+        self.assertFalse(self.backend.add("lease", 2, 60))
+        self.backend.delete("lease")
+        self.assertTrue(self.backend.add("lease", 3, 60))
+
+    def test_add_after_expiry(self):
+        self.assertTrue(self.backend.add("lease", 1, 0.05))
+        time.sleep(0.1)
+        self.assertTrue(self.backend.add("lease", 2, 60))
+
+
+class MemoryBackendTests(BackendTests, unittest.TestCase):
+    def create_backend(self):
+        return MemoryBackend()
+
+
+class SQLiteBackendTests(BackendTests, unittest.TestCase):
+    def create_backend(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        return SQLiteBackend(os.path.join(self.directory.name, "cache.sqlite3"))
+
+    def test_corrupt_value(self):
+        self.backend._execute(
+            "INSERT INTO cache VALUES (?, ?, ?, NULL)", ("key", "{not json", 0)
+        )
+        with self.assertRaises(CacheBackendError):
+            self.backend.get("key")
+
+
+class RedisBackendTests(BackendTests, unittest.TestCase):
+    password = "secret"
+
+    def create_backend(self):
+        self.server = FakeRedisServer(password=self.password)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        host, port = self.server.server_address
+        return RedisBackend(f"redis://:{self.password}@{host}:{port}/1")
+
+    def test_keys_are_prefixed(self):
+        self.backend.set("key", "value", 1.0)
+        self.assertIn(cache_backend.CACHE_KEY_PREFIX + "key", self.server.data)
+
+    def test_corrupt_value(self):
+        self.server.data[cache_backend.CACHE_KEY_PREFIX + "key"] = ("{not json", None)
+        with self.assertRaises(CacheBackendError):
+            self.backend.get("key")
+
+    def test_wrong_password(self):
+        host, port = self.server.server_address
+        backend = RedisBackend(f"redis://:wrong@{host}:{port}")
+        with self.assertRaises(CacheBackendError):
+            backend.get("key")
+
+    def test_unreachable(self):
+        host, port = self.server.server_address
+        self.server.shutdown()
+        self.server.server_close()
+        backend = RedisBackend(f"redis://{host}:{port}")
+        with self.assertRaises(CacheBackendError):
+            backend.get("key")
+
+
+class SharedHelperTests(unittest.TestCase):
+    def setUp(self):
+        self.original = cache_backend._cache_backend
+        self.addCleanup(setattr, cache_backend, "_cache_backend", self.original)
+        # Nothing listens on port 1, so every call fails
+        cache_backend._cache_backend = RedisBackend("redis://127.0.0.1:1")
+
+    def test_errors_are_a_miss(self):
+        self.assertIsNone(cache_backend.get_shared("key"))
+        cache_backend.set_shared("key", "value")
+
+    def test_lease_granted_on_error(self):
+        self.assertTrue(cache_backend.acquire_lease("lease", 60))
+        cache_backend.release_lease("lease")
+
+
+if __name__ == "__main__":
+    unittest.main()
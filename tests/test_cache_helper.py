@@ -0,0 +1,85 @@
+"""
+Tests for the cached upstream data falling back to stale or default values
+when Gitea fails.
+
+Run from the repository root with `python3 -m unittest discover -s tests`.
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache_backend
+import cache_helper
+
+
+def make_response(status_code: int, body) -> mock.Mock:
+    response = mock.Mock(status_code=status_code)
+    response.json.return_value = body
+    response.raise_for_status.side_effect = (
+        requests.HTTPError(f"{status_code} Error") if status_code >= 400 else None
+    )
+    return response
+
+
+class GitActivityTests(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(
+                cache_backend, "_cache_backend", cache_backend.MemoryBackend()
+            ),
+            mock.patch.dict(
+                cache_helper._data_cache, {"git": {"data": None, "timestamp": 0}}
+            ),
+            mock.patch.dict(cache_helper._empty_fetches, {"git": 0.0}),
+            mock.patch.object(cache_helper, "start_background_refresh"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def mock_gitea(self, status_code: int, body):
+        patch = mock.patch.object(
+            cache_helper.http_client,
+            "get",
+            return_value=make_response(status_code, body),
+        )
+        self.addCleanup(patch.stop)
+        return patch.start()
+
+    def test_server_error_serves_default(self):
+        self.mock_gitea(500, {"message": "Internal Server Error"})
+        self.assertEqual(
+            cache_helper.get_git_latest_activity(), cache_helper.DEFAULT_GIT_ACTIVITY
+        )
+
+    def test_error_body_serves_default(self):
+        self.mock_gitea(200, {"message": "token is required"})
+        self.assertEqual(
+            cache_helper.get_git_latest_activity(), cache_helper.DEFAULT_GIT_ACTIVITY
+        )
+
+    def test_failure_is_negatively_cached(self):
+        get = self.mock_gitea(503, {"message": "Service Unavailable"})
+        cache_helper.get_git_latest_activity()
+        cache_helper.get_git_latest_activity()
+        self.assertEqual(get.call_count, 1)
+
+    def test_server_error_keeps_stale_data(self):
+        activity = {"repo": {"name": "website"}}
+        self.mock_gitea(200, [activity])
+        self.assertEqual(cache_helper.get_git_latest_activity(), activity)
+
+        self.mock_gitea(500, {"message": "Internal Server Error"})
+        with self.assertRaises(requests.HTTPError):
+            cache_helper.refresh_data("git", force=True)
+        self.assertEqual(cache_helper.get_git_latest_activity(), activity)
+
+
+if __name__ == "__main__":
+    unittest.main()
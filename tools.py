@@ -1,4 +1,6 @@
 import datetime
+import glob
+import hashlib
 import json
 import os
 import re
@@ -9,9 +11,14 @@ from functools import lru_cache
 import jinja2
 from dateutil.parser import parse
 from flask import Request, jsonify, make_response, render_template
+from werkzeug.http import is_resource_modified
+
+from assets import get_asset_version
+from pagecache import cached_response
 
 # HTTP status codes
 HTTP_OK = 200
+HTTP_NOT_MODIFIED = 304
 HTTP_BAD_REQUEST = 400
 HTTP_NOT_FOUND = 404
 
@@ -65,14 +72,23 @@ def getGitCommit() -> str:
     if os.path.isdir(".git"):
         git_dir = ".git"
         head_ref = ""
-        with open(os.path.join(git_dir, "HEAD")) as file:
-            head_ref = file.read().strip()
-        if head_ref.startswith("ref: "):
+        try:
+            with open(os.path.join(git_dir, "HEAD")) as file:
+                head_ref = file.read().strip()
+            if not head_ref.startswith("ref: "):
+                return head_ref
             head_ref = head_ref[5:]
-            with open(os.path.join(git_dir, head_ref)) as file:
-                return file.read().strip()
-        else:
-            return head_ref
+            if os.path.isfile(os.path.join(git_dir, head_ref)):
+                with open(os.path.join(git_dir, head_ref)) as file:
+                    return file.read().strip()
+            # The ref may only be in packed-refs ("<hash> <ref>" lines)
+            with open(os.path.join(git_dir, "packed-refs")) as file:
+                for line in file:
+                    commit, _, ref = line.strip().partition(" ")
+                    if ref == head_ref:
+                        return commit
+        except OSError:
+            pass
 
     # Check if env SOURCE_COMMIT is set
     if "SOURCE_COMMIT" in os.environ:
@@ -81,6 +97,34 @@ def getGitCommit() -> str:
     return "failed to get version"
 
 
+def _hash_source_files() -> str:
+    root = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for pattern in ("*.py", "blueprints/*.py"):
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            with open(path, "rb") as file:
+                digest.update(os.path.relpath(path, root).encode() + b"\0")
+                digest.update(file.read())
+    return digest.hexdigest()[:12]
+
+
+def get_code_version() -> str:
+    """
+    Get a version that changes whenever the deployed code changes.
+    This is the git commit, or a hash of the Python sources when the commit
+    isn't known (e.g. a Docker image without SOURCE_COMMIT).
+
+    Returns:
+        str: The code version
+    """
+    commit = getGitCommit()
+    return _hash_source_files() if commit == "failed to get version" else commit
+
+
+# Resolved once, as the running code doesn't change until a restart
+CODE_VERSION = get_code_version()
+
+
 def isCLI(request: Request) -> bool:
     """
     Check if the request is from curl or hurl.
@@ -184,24 +228,6 @@ def getAddress(coin: str) -> str:
     return address
 
 
-@lru_cache(maxsize=256)
-def getFilePath(name: str, path: str) -> str | None:
-    """
-    Find a file in a directory tree.
-
-    Args:
-        name (str): The filename to find
-        path (str): The root directory to search
-
-    Returns:
-        Optional[str]: The full path to the file or None if not found
-    """
-    for root, dirs, files in os.walk(path):
-        if name in files:
-            return os.path.join(root, name)
-    return None
-
-
 def json_response(
     request: Request, message: str | dict = "404 Not Found", code: int = 404
 ):
@@ -265,6 +291,80 @@ def error_response(
     return response
 
 
+def get_mtime(path: str) -> float:
+    """
+    Get a file or directory's modification time.
+
+    Args:
+        path (str): The path
+
+    Returns:
+        float: The mtime, or 0 if the path doesn't exist
+    """
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def get_source_validators(sources: list[str], *keys) -> tuple[str, float]:
+    """
+    Compute an ETag and Last-Modified time for a response rendered from source files.
+    The ETag also covers the code version, asset version and any extra keys the
+    output depends on (e.g. host or query args).
+
+    Args:
+        sources (List[str]): Paths of the files the response is rendered from
+        *keys: Extra values the rendered output depends on
+
+    Returns:
+        Tuple[str, float]: The ETag and the latest source modification timestamp
+    """
+    mtimes = [get_mtime(f) for f in sources]
+    parts = [CODE_VERSION, get_asset_version(), *sources, *map(str, mtimes)]
+    parts += [str(key) for key in keys]
+    etag = hashlib.sha256("\0".join(parts).encode()).hexdigest()[:32]
+    return etag, max(mtimes, default=0.0)
+
+
+def conditional_response(
+    request: Request, sources: list[str], render, *keys, cache_key=None
+):
+    """
+    Serve a rendered response with ETag/Last-Modified validators.
+    Conditional requests that still match are answered with a 304 without rendering.
+
+    Args:
+        request (Request): The Flask request object
+        sources (List[str]): Paths of the files the response is rendered from
+        render (Callable): Function returning the response to send
+        *keys: Extra values the rendered output depends on
+        cache_key (Optional[tuple]): Key to store the rendered page in the page cache
+
+    Returns:
+        Response: The rendered response or a 304 Not Modified response
+    """
+    etag, mtime = get_source_validators(sources, *keys)
+    last_modified = datetime.datetime.fromtimestamp(int(mtime), tz=datetime.UTC)
+
+    if not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    ):
+        response = make_response("", HTTP_NOT_MODIFIED)
+    elif cache_key is not None:
+        response = cached_response(cache_key, etag, render)
+        if response.status_code != HTTP_OK:
+            return response
+    else:
+        response = make_response(render())
+        if response.status_code != HTTP_OK:
+            return response
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
+
+
 def parse_date(date_groups: list[str]) -> str | None:
     """
     Parse a list of date components into YYYY-MM-DD format.
@@ -302,6 +402,30 @@ def get_tools_data():
         return json.load(f)
 
 
+SITES_FILE = "data/sites.json"
+
+
+@lru_cache(maxsize=1)
+def _load_sites(mtime: float) -> list:
+    if not mtime:
+        return []
+    with open(SITES_FILE) as f:
+        sites = json.load(f)
+    # Remove any sites that are not enabled
+    return [site for site in sites if "enabled" not in site or site["enabled"]]
+
+
+def get_sites() -> list:
+    """
+    Get the enabled sites from data/sites.json.
+    Reloaded when the file's mtime changes, so it matches the page ETags.
+
+    Returns:
+        list: The enabled sites
+    """
+    return _load_sites(get_mtime(SITES_FILE))
+
+
 def find_chromium() -> str | None:
     """Find available chromium/chrome binary for headless PDF generation."""
     for cmd in ["chromium", "chromium-browser", "google-chrome", "chrome"]: